@@ -0,0 +1,618 @@
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import queue
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+import cv2
+import numpy as np
+from PIL import Image
+
+import main
+
+
+def synthetic_faces(n_identities, samples_per_identity, size=100, noise=12, shift=0, seed=0):
+    rng = np.random.default_rng(seed)
+    faces = []
+    labels = []
+    for label in range(n_identities):
+        base = cv2.GaussianBlur(rng.integers(0, 256, (size, size), dtype=np.uint8), (5, 5), 0)
+        for _ in range(samples_per_identity):
+            jitter = rng.integers(-noise, noise + 1, (size, size))
+            face = np.clip(base.astype(np.int16) + jitter, 0, 255).astype(np.uint8)
+            if shift:
+                face = np.roll(face, tuple(rng.integers(-shift, shift + 1, 2)), axis=(0, 1))
+            faces.append(face)
+            labels.append(label)
+    return faces, np.array(labels, np.int32)
+
+
+def load_face_data(path, max_identities=None):
+    # Reads FaceData/<id>/*.jpg folders, or a flat folder of {Name}.{id}.{n}.jpg files that has
+    # not been migrated yet.
+    groups = {}
+    for name in sorted(os.listdir(path)):
+        parts = name.split('.')
+        if name.isdigit() and os.path.isdir(os.path.join(path, name)):
+            groups[int(name)] = sorted(glob.glob(os.path.join(path, name, '*.jpg')) +
+                                       glob.glob(os.path.join(path, name, '*.npz')))
+        elif len(parts) == 4 and parts[1].isdigit():
+            groups.setdefault(int(parts[1]), []).append(os.path.join(path, name))
+    faces = []
+    labels = []
+    for label in sorted(groups)[:max_identities]:
+        for file in groups[label]:
+            stack = main.load_face_archive(file) if main.is_face_archive(file) else [
+                cv2.imread(file, cv2.IMREAD_GRAYSCALE)]
+            faces.extend(stack)
+            labels.extend([label] * len(stack))
+    return faces, np.array(labels, np.int32)
+
+
+def split_holdout(faces, labels, every):
+    train = [i for i in range(len(labels)) if i % every]
+    test = [i for i in range(len(labels)) if not i % every]
+    return ([faces[i] for i in train], labels[train]), ([faces[i] for i in test], labels[test])
+
+
+def evaluate_model(segment, faces, labels, prepare=None):
+    segment.matcher.get_row_sums()
+    model = main.SegmentedLBPHModel([segment])
+    times = []
+    correct = accepted = 0
+    for face, label in zip(faces, labels):
+        start = time.perf_counter()
+        predicted, distance = model.predict(prepare(face) if prepare else face)
+        times.append(time.perf_counter() - start)
+        correct += predicted == label
+        accepted += predicted == label and main.match_confidence(distance) > main.RECOGNITION_CONFIDENCE
+    return {
+        'samples': len(segment.labels),
+        'model_bytes': int(segment.histograms.nbytes + segment.labels.nbytes),
+        'predict': percentiles(times),
+        'top1_accuracy': round(correct / len(labels), 4),
+        'accepted_at_threshold': round(accepted / len(labels), 4),
+        'threshold': main.RECOGNITION_CONFIDENCE,
+    }
+
+
+def percentiles(samples):
+    samples = np.asarray(samples) * 1000
+    return {
+        'p50_ms': round(float(np.percentile(samples, 50)), 3),
+        'p95_ms': round(float(np.percentile(samples, 95)), 3),
+        'p99_ms': round(float(np.percentile(samples, 99)), 3),
+    }
+
+
+def bench_matcher(args):
+    faces, labels = synthetic_faces(args.identities, args.samples, args.size)
+    queries, expected = synthetic_faces(args.identities, 1, args.size, seed=1)
+    queries, expected = queries[:args.queries], expected[:args.queries]
+
+    recognizer = cv2.face.LBPHFaceRecognizer_create()
+    recognizer.train(faces, labels)
+    segment = main.LBPHModel.from_recognizer(recognizer)
+    segment.matcher.get_row_sums()
+    model = main.SegmentedLBPHModel([segment])
+
+    opencv_times, opencv_results = [], []
+    for query in queries:
+        start = time.perf_counter()
+        opencv_results.append(recognizer.predict(query))
+        opencv_times.append(time.perf_counter() - start)
+
+    numpy_times, numpy_results = [], []
+    for query in queries:
+        start = time.perf_counter()
+        numpy_results.append(model.predict(query))
+        numpy_times.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    model.predict_batch(queries)
+    batch_time = time.perf_counter() - start
+
+    same_label = sum(a[0] == b[0] for a, b in zip(opencv_results, numpy_results))
+    same_confidence = sum(main.match_confidence(a[1]) == main.match_confidence(b[1])
+                          for a, b in zip(opencv_results, numpy_results))
+    return {
+        'samples': len(labels),
+        'queries': len(queries),
+        'opencv_predict': percentiles(opencv_times),
+        'numpy_predict': percentiles(numpy_times),
+        'numpy_batch_per_query_ms': round(1000 * batch_time / len(queries), 3),
+        'same_label': same_label,
+        'same_confidence': same_confidence,
+        'max_distance_error': float(max(abs(a[1] - b[1]) for a, b in zip(opencv_results, numpy_results))),
+    }
+
+
+def bench_prototypes(args):
+    if args.face_data:
+        faces, labels = load_face_data(args.face_data, args.identities)
+    else:
+        faces, labels = synthetic_faces(args.identities, args.samples, args.size, shift=2)
+    (train_faces, train_labels), (test_faces, test_labels) = split_holdout(faces, labels, args.holdout)
+
+    full = main.LBPHModel.from_faces(train_faces, train_labels)
+    results = {'all_samples': evaluate_model(full, test_faces, test_labels)}
+    for k in args.k:
+        start = time.perf_counter()
+        compressed = full.compress(k)
+        report = evaluate_model(compressed, test_faces, test_labels)
+        report['compress_seconds'] = round(time.perf_counter() - start, 3)
+        results[f'k={k}'] = report
+    return results
+
+
+def bench_normalization(args):
+    # Crops arrive at whatever size the detector returned, so each one is rescaled to a random
+    # size first. 'native' is the old behaviour: 450x450 training crops, queries equalized as-is.
+    if args.face_data:
+        faces, labels = load_face_data(args.face_data, args.identities)
+    else:
+        faces = [main.synthetic_face(identity, sample) for identity in range(args.identities)
+                 for sample in range(args.samples)]
+        labels = np.repeat(np.arange(args.identities, dtype=np.int32), args.samples)
+    rng = np.random.default_rng(0)
+    crops = [cv2.resize(face, (int(size), int(size)))
+             for face, size in zip(faces, rng.integers(args.min_face, args.max_face + 1, len(faces)))]
+    (train_faces, train_labels), (test_faces, test_labels) = split_holdout(crops, labels, args.holdout)
+
+    start = time.perf_counter()
+    native = main.LBPHModel.from_faces([cv2.resize(face, (450, 450)) for face in train_faces], train_labels)
+    results = {'native': evaluate_model(native, test_faces, test_labels, cv2.equalizeHist)}
+    results['native']['train_seconds'] = round(time.perf_counter() - start, 3)
+    for size in args.sizes:
+        start = time.perf_counter()
+        model = main.LBPHModel.from_faces([main.normalize_face(face, size=size) for face in train_faces],
+                                          train_labels)
+        train_seconds = round(time.perf_counter() - start, 3)
+        results[f'{size}x{size}'] = evaluate_model(model, test_faces, test_labels,
+                                                   lambda face: main.normalize_face(face, size=size))
+        results[f'{size}x{size}']['train_seconds'] = train_seconds
+    return results
+
+
+def capture_stream(identity, frames, seed=0):
+    # One person in front of the enrolment camera: slow head movement, drifting light and an
+    # occasional motion-blurred frame. Yields canonical-size crops before equalization.
+    rng = np.random.default_rng((identity, seed))
+    angle = shift = light = 0.0
+    for i in range(frames):
+        angle = np.clip(angle + rng.normal(0, 1.2), -15, 15)
+        shift = np.clip(shift + rng.normal(0, 0.6), -8, 8)
+        light = np.clip(light + rng.normal(0, 3), -90, 90)
+        matrix = cv2.getRotationMatrix2D((100, 100), angle, 1)
+        matrix[0, 2] += shift
+        face = cv2.warpAffine(main.synthetic_face(identity, seed * frames + i), matrix, (200, 200),
+                              borderMode=cv2.BORDER_REPLICATE)
+        face = np.clip(face.astype(np.int16) + int(light), 0, 255).astype(np.uint8)
+        if rng.random() < 0.2:
+            face = cv2.GaussianBlur(face, (15, 15), 0)
+        yield main.normalize_face(face, equalize=False)
+
+
+def bench_enrolment(args):
+    # take_images before and after quality selection, on the same simulated capture streams.
+    queries, query_labels = [], []
+    for identity in range(args.identities):
+        for i, face in enumerate(capture_stream(identity, args.queries * 10, seed=1)):
+            if not i % 10:
+                queries.append(face)
+                query_labels.append(identity)
+    query_labels = np.array(query_labels, np.int32)
+
+    strategies = {f'first_{main.ENROLMENT_TARGET_SAMPLES}': main.ENROLMENT_TARGET_SAMPLES,
+                  f'first_{args.target}': args.target, 'selected': None}
+    results = {}
+    for name, blind in strategies.items():
+        faces, labels, frames = [], [], 0
+        start = time.perf_counter()
+        for identity in range(args.identities):
+            selector = main.EnrolmentSelector(args.target, select=True)
+            kept = 0
+            for face in capture_stream(identity, args.max_frames):
+                frames += 1
+                if blind or selector.consider(face):
+                    faces.append(main.normalize_face(face))
+                    labels.append(identity)
+                    kept += 1
+                if kept == blind or selector.done():
+                    break
+        capture_seconds = time.perf_counter() - start
+        report = evaluate_model(main.LBPHModel.from_faces(faces, labels), queries, query_labels,
+                                main.normalize_face)
+        report['frames_per_employee'] = round(frames / args.identities, 1)
+        report['capture_ms_per_frame'] = round(1000 * capture_seconds / frames, 3)
+        results[name] = report
+    return results
+
+
+def write_face_images(directory, count, size=450):
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    faces, labels = synthetic_faces(max(1, count // 200), 200, size)
+    for i in range(count):
+        path = os.path.join(directory, f'Synthetic.{labels[i % len(labels)]}.{i}.jpg')
+        if not os.path.exists(path):
+            cv2.imwrite(path, faces[i % len(faces)])
+        paths.append(path)
+    return paths
+
+
+def train_in_memory(paths, model_path):
+    # train_images before the streaming loader: every frame decoded into one list first.
+    faces = [np.array(Image.open(path).convert('L'), 'uint8') for path in paths]
+    labels = [int(os.path.basename(path).split('.')[1]) for path in paths]
+    main.LBPHModel.from_faces(faces, labels).save(model_path)
+
+
+def train_production(paths, model_dir):
+    # The path train_images takes: run_training_job with an empty feature cache, appending to a
+    # fresh model store.
+    labels = [int(os.path.basename(path).split('.')[1]) for path in paths]
+    main.feature_cache = main.LBPHFeatureCache(os.path.join(model_dir, 'features.db'))
+    main.face_model_store = main.LBPHModelStore(model_dir)
+    messages = queue.Queue()
+    main.run_training_job(paths, labels, messages, threading.Event())
+    kind, text, _, _ = list(messages.queue)[-1]
+    if kind != 'done':
+        raise RuntimeError(text)
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None  # Windows has no getrusage
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def run_measured(target, args, results):
+    start = time.perf_counter()
+    report = target(*args) or {}
+    report.update({
+        'seconds': round(time.perf_counter() - start, 3),
+        'peak_rss_mb': peak_rss_mb(),
+    })
+    results.put(report)
+
+
+def measure_in_child(target, *args):
+    results = multiprocessing.Queue()
+    process = multiprocessing.Process(target=run_measured, args=(target, args, results))
+    process.start()
+    # Drain the queue before join(): a child blocked writing a large report would never exit.
+    report = None
+    while report is None and (process.is_alive() or not results.empty()):
+        try:
+            report = results.get(timeout=1)
+        except queue.Empty:
+            pass
+    process.join()
+    if report is None:
+        return {'failed': f'exit code {process.exitcode}'}
+    return report
+
+
+def bench_loader(args):
+    directory = args.directory or tempfile.mkdtemp(prefix='facedata-')
+    results = {'workers': main.TRAINING_WORKERS, 'chunk_size': main.TRAINING_CHUNK_SIZE}
+    for count in args.sizes:
+        paths = write_face_images(os.path.join(directory, str(count)), count)
+        model_path = os.path.join(directory, f'{count}.lbph')
+        results[count] = {
+            'in_memory': measure_in_child(train_in_memory, paths, model_path),
+            'production': measure_in_child(train_production, paths, tempfile.mkdtemp(dir=directory)),
+        }
+    return results
+
+
+def evict_page_cache(paths):
+    # Best effort: without posix_fadvise (Windows) the "cold" reads below are warm.
+    if not hasattr(os, 'posix_fadvise'):
+        return False
+    for path in paths:
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+    return True
+
+
+def write_storage_layouts(directory, identities, samples):
+    # The same canonical faces stored both ways: jpeg/<id>/<n>.jpg and archive/<id>/faces.npz.
+    layouts = {'jpeg': ([], []), 'archive': ([], [])}
+    for label in range(identities):
+        faces = [main.normalize_face(main.synthetic_face(label, i)) for i in range(samples)]
+        folder = os.path.join(directory, 'jpeg', str(label))
+        os.makedirs(folder, exist_ok=True)
+        for n, face in enumerate(faces, 1):
+            path = os.path.join(folder, f'{n}.jpg')
+            if not os.path.exists(path):
+                cv2.imwrite(path, face)
+            layouts['jpeg'][0].append(path)
+            layouts['jpeg'][1].append(label)
+        folder = os.path.join(directory, 'archive', str(label))
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, main.FACE_ARCHIVE_NAME)
+        if not os.path.exists(path):
+            main.write_face_archive(path, [cv2.imread(p, cv2.IMREAD_GRAYSCALE)
+                                           for p in layouts['jpeg'][0][-samples:]])
+        layouts['archive'][0].append(path)
+        layouts['archive'][1].append(label)
+    return layouts
+
+
+def read_faces(paths):
+    count = 0
+    for path in paths:
+        count += len(main.load_face_archive(path)) if main.is_face_archive(path) else int(
+            main.load_gray_image(path) is not None)
+    return count
+
+
+def bench_storage(args):
+    directory = args.directory or tempfile.mkdtemp(prefix='facestore-')
+    layouts = write_storage_layouts(directory, args.identities, args.samples)
+    results = {'identities': args.identities, 'samples': args.samples, 'face_size': main.FACE_SIZE}
+    for name, (paths, labels) in layouts.items():
+        stats = [os.stat(path) for path in paths]
+        result = {
+            'files': len(paths),
+            'bytes': sum(stat.st_size for stat in stats),
+            # st_blocks is POSIX-only; Windows reports the apparent size alone.
+            'disk_bytes': sum(stat.st_blocks * 512 for stat in stats) if hasattr(stats[0], 'st_blocks') else None,
+        }
+        result['page_cache_evicted'] = evict_page_cache(paths)
+        start = time.perf_counter()
+        result['faces'] = read_faces(paths)
+        result['read_cold_s'] = round(time.perf_counter() - start, 4)
+        start = time.perf_counter()
+        read_faces(paths)
+        result['read_warm_s'] = round(time.perf_counter() - start, 4)
+        # Full training input with an empty feature cache: read, decode, LBPH and cache insert.
+        main.feature_cache = main.LBPHFeatureCache(os.path.join(tempfile.mkdtemp(), 'features.db'))
+        evict_page_cache(paths)
+        start = time.perf_counter()
+        histograms, _ = main.training_histograms(paths, labels)
+        result['histograms_s'] = round(time.perf_counter() - start, 4)
+        start = time.perf_counter()
+        main.training_histograms(paths, labels)
+        result['histograms_cached_s'] = round(time.perf_counter() - start, 4)
+        result['histogram_rows'] = len(histograms)
+        results[name] = result
+    return results
+
+
+class StageTimer:
+    def __init__(self):
+        self.samples = {}
+
+    @contextmanager
+    def __call__(self, stage):
+        start = time.perf_counter()
+        yield
+        self.samples.setdefault(stage, []).append(time.perf_counter() - start)
+
+    def report(self):
+        return {stage: dict(percentiles(times), calls=len(times)) for stage, times in self.samples.items()}
+
+
+class TimedDetector(main.FaceDetector):
+    def __init__(self, cascade, timer, **kwargs):
+        super().__init__(cascade, **kwargs)
+        self.timer = timer
+
+    def prepare(self, gray):
+        with self.timer('downscale_equalize'):
+            return super().prepare(gray)
+
+    def detect_prepared(self, small):
+        with self.timer('detect'):
+            return super().detect_prepared(small)
+
+
+class TimedTracker(main.FaceTracker):
+    def follow(self, small):
+        with self.detector.timer('track'):
+            return super().follow(small)
+
+
+def enrol_synthetic(model_path, identities, samples):
+    # Templates are detector crops of the same synthetic frames run_pipeline shows, as a camera
+    # enrolment would store them, so its probes can clear RECOGNITION_CONFIDENCE.
+    detector = main.FaceDetector(cv2.CascadeClassifier(main.CASCADE_PATH), distances=main.KIOSK_DISTANCES)
+    labels = np.repeat(np.arange(identities, dtype=np.int32), samples)
+
+    def crops(label):
+        faces = [main.synthetic_face(label, i) for i in range(samples)]
+        source = main.SyntheticSource(faces=faces, frames=samples, hold=1)
+        for face in faces:
+            _, frame = source.read()
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            boxes = detector.detect(gray)
+            # An undetected sample still needs its row: fall back to the whole face.
+            yield main.normalize_face(gray, max(boxes, key=lambda box: box[2] * box[3])) if boxes \
+                else main.normalize_face(face)
+
+    main.write_lbph_model(model_path, labels, (np.vstack([main.lbph_histogram(face) for face in crops(label)])
+                                               for label in range(identities)))
+
+
+def write_employees(db_path, identities):
+    with sqlite3.connect(db_path) as conn:
+        cursor = conn.cursor()
+        cursor.execute('DROP TABLE IF EXISTS employees')
+        cursor.execute('CREATE TABLE employees (employee_id INTEGER PRIMARY KEY, name TEXT, '
+                       'face_id TEXT, department TEXT)')
+        cursor.executemany('INSERT INTO employees VALUES (?, ?, ?, ?)',
+                           ((i, f'Employee {i}', 'Enrolled', 'Synthetic') for i in range(identities)))
+        conn.commit()
+    conn.close()
+
+
+def run_pipeline(source, model_path, db_path, identities, frames, hold):
+    # capture_attendance's per-frame work in identification mode, minus imshow.
+    segment = main.LBPHModel.load(model_path)
+    segment.matcher.get_row_sums()
+    model = main.SegmentedLBPHModel([segment])
+    directory = main.EmployeeDirectory(db_path)
+    directory.preload()
+
+    if source == 'synthetic':
+        shown = [int(label) for label in np.linspace(0, identities - 1, min(identities, 10)).astype(int)]
+        capture = main.SyntheticSource(faces=[main.synthetic_face(label, 1000) for label in shown],
+                                       frames=frames, hold=hold, loop=False)
+    else:
+        capture = main.open_frame_source(source, loop=True)
+
+    timer = StageTimer()
+    tracker = TimedTracker(TimedDetector(cv2.CascadeClassifier(main.CASCADE_PATH), timer,
+                                         distances=main.KIOSK_DISTANCES))
+    voter = main.IdentityVoter()
+    decisions = count = 0
+    latencies, decision_frames = [], []
+    start = time.perf_counter()
+    while count < frames:
+        with timer('read'):
+            ret, img = capture.read()
+        if not ret:
+            break
+        with timer('frame'):
+            with timer('cvtColor'):
+                gray_img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+            with timer('detect_or_track'):
+                features = tracker.update(gray_img)
+            if not features:
+                voter.reset()
+            with timer('normalize_predict'):
+                matches = main.recognize_faces(gray_img, features, model)
+            for (x, y, w, h), id, predict in matches:
+                with timer('lookup'):
+                    employee = directory.get(id)
+                with timer('vote'):
+                    decision = voter.add(id, predict)
+                with timer('draw'):
+                    cv2.rectangle(img, (x, y), (x + w, y + h), (0, 255, 0), 3)
+                    cv2.putText(img, employee[0] if employee else 'Unknown', (x, y + h),
+                                cv2.FONT_HERSHEY_COMPLEX, 0.8, (255, 255, 255), 3)
+                if decision is not None:
+                    decisions += 1
+                    latencies.append(voter.decision_latency)
+                    decision_frames.append(voter.frames_to_decision)
+        count += 1
+    elapsed = time.perf_counter() - start
+    capture.release()
+
+    report = {
+        'identities': identities,
+        'samples': len(segment.labels),
+        'frames': count,
+        'fps': round(count / elapsed, 1),
+        'cascade_frames': tracker.detections,
+        'decisions': decisions,
+        'decision_latency': percentiles(latencies) if latencies else None,
+        'frames_to_decision': float(np.median(decision_frames)) if decision_frames else None,
+        'stages': timer.report(),
+    }
+    return report
+
+
+def bench_pipeline(args):
+    directory = args.directory or tempfile.mkdtemp(prefix='pipeline-')
+    os.makedirs(directory, exist_ok=True)
+    results = {
+        'source': args.source,
+        'detection_scale': main.DETECTION_SCALE,
+        'redetect_interval': main.TRACKING_REDETECT_INTERVAL,
+    }
+    for identities in args.identities:
+        model_path = os.path.join(directory, f'{identities}x{args.samples}-crops.lbph')
+        db_path = os.path.join(directory, f'{identities}.db')
+        if not os.path.exists(model_path):
+            enrol_synthetic(model_path, identities, args.samples)
+        write_employees(db_path, identities)
+        results[identities] = measure_in_child(run_pipeline, args.source, model_path, db_path,
+                                               identities, args.frames, args.hold)
+    return results
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description='Face recognition benchmarks')
+    parser.add_argument('--output', help='also write the results to this JSON file')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    matcher = commands.add_parser('matcher', help='NumPy chi-square matcher vs LBPHFaceRecognizer.predict')
+    matcher.add_argument('--identities', type=int, default=100)
+    matcher.add_argument('--samples', type=int, default=20)
+    matcher.add_argument('--queries', type=int, default=50)
+    matcher.add_argument('--size', type=int, default=100)
+    matcher.set_defaults(func=bench_matcher)
+
+    prototypes = commands.add_parser('prototypes', help='per-employee prototype compression')
+    prototypes.add_argument('--face-data', help='enrolment folder to use instead of synthetic faces')
+    prototypes.add_argument('--identities', type=int, default=50)
+    prototypes.add_argument('--samples', type=int, default=200)
+    prototypes.add_argument('--size', type=int, default=100)
+    prototypes.add_argument('--holdout', type=int, default=5, help='every n-th image is a query')
+    prototypes.add_argument('--k', type=int, nargs='+', default=[5, 10, 20])
+    prototypes.set_defaults(func=bench_prototypes)
+
+    normalization = commands.add_parser('normalization', help='predict latency and accuracy per canonical face size')
+    normalization.add_argument('--face-data', help='enrolment folder to use instead of synthetic faces')
+    normalization.add_argument('--identities', type=int, default=50)
+    normalization.add_argument('--samples', type=int, default=20)
+    normalization.add_argument('--min-face', type=int, default=60, help='smallest detected face, pixels')
+    normalization.add_argument('--max-face', type=int, default=300, help='largest detected face, pixels')
+    normalization.add_argument('--holdout', type=int, default=5, help='every n-th image is a query')
+    normalization.add_argument('--sizes', type=int, nargs='+', default=[50, 75, 100, 150, 200])
+    normalization.set_defaults(func=bench_normalization)
+
+    enrolment = commands.add_parser('enrolment', help='blind 200-frame capture vs quality-selected enrolment')
+    enrolment.add_argument('--identities', type=int, default=20)
+    enrolment.add_argument('--target', type=int, default=main.ENROLMENT_SELECTED_SAMPLES, help='faces the selector keeps per employee')
+    enrolment.add_argument('--max-frames', type=int, default=main.ENROLMENT_MAX_FRAMES)
+    enrolment.add_argument('--queries', type=int, default=10, help='held-out frames per identity')
+    enrolment.set_defaults(func=bench_enrolment)
+
+    loader = commands.add_parser('loader', help='enrolment image loading and training, time and peak RSS')
+    loader.add_argument('--directory', help='where to write (and reuse) the synthetic JPEG sets')
+    loader.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    loader.set_defaults(func=bench_loader)
+
+    storage = commands.add_parser('storage', help='loose enrolment JPEGs vs one archive per employee, I/O and disk')
+    storage.add_argument('--directory', help='where to write (and reuse) both layouts')
+    storage.add_argument('--identities', type=int, default=100)
+    storage.add_argument('--samples', type=int, default=200)
+    storage.set_defaults(func=bench_storage)
+
+    pipeline = commands.add_parser('pipeline', help='headless attendance loop, per-stage latency, fps and peak RSS')
+    pipeline.add_argument('--source', default='synthetic',
+                          help="'synthetic', a recorded video or a directory of frames")
+    pipeline.add_argument('--identities', type=int, nargs='+', default=[10, 100, 1000, 5000])
+    pipeline.add_argument('--samples', type=int, default=3, help='enrolled images per identity')
+    pipeline.add_argument('--frames', type=int, default=300)
+    pipeline.add_argument('--hold', type=int, default=30, help='synthetic frames per person')
+    pipeline.add_argument('--directory', help='where to write (and reuse) the synthetic models')
+    pipeline.set_defaults(func=bench_pipeline)
+
+    args = parser.parse_args()
+
+    results = {'benchmark': args.command, 'results': args.func(args)}
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main_cli()
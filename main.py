@@ -1,4 +1,17 @@
+import argparse
 import glob
+import hashlib
+import json
+import multiprocessing
+from multiprocessing import shared_memory
+import queue
+import shutil
+import signal
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+import struct
+import threading
 from tkinter import *
 from tkinter import messagebox, ttk, Checkbutton, IntVar, END
 import sqlite3
@@ -10,11 +23,15 @@ from tkcalendar import DateEntry
 import cv2
 import os
 import numpy as np
-from PIL import Image
 import csv
 from tkinter.filedialog import asksaveasfilename
 import re
 from fpdf import FPDF
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
 
 WINDOW_WIDTH = 1350
 WINDOW_HEIGHT = 760
@@ -33,6 +50,74 @@ FONT_BOLD_27 = ('Calibri', 27, 'bold')
 BG_COLOR = '#273b7a'
 FG_COLOR = 'white'
 
+CASCADE_PATH = 'haarcascade_frontalface_default.xml'
+CLASSIFIER_DIR = 'Classifier'
+CLASSIFIER_MANIFEST = 'manifest.json'
+CLASSIFIER_LOCK = 'manifest.lock'
+LEGACY_CLASSIFIER_MODEL = 'Classifier.lbph'
+LEGACY_CLASSIFIER_YAML = 'Classifier.yml'
+FEATURE_CACHE_PATH = 'Classifier/features.db'
+TRAINING_CHUNK_SIZE = 64
+TRAINING_WORKERS = os.cpu_count() or 1
+TRAINING_POLL_INTERVAL = 200
+MODEL_RELOAD_INTERVAL = 5
+MODEL_VERIFY_CHECKSUMS = True
+ATTENDANCE_VERIFICATION_MODE = True
+
+DETECTION_SCALE = 0.5
+DETECTION_SCALE_FACTOR = 1.2
+DETECTION_MIN_NEIGHBORS = 5
+CAMERA_HORIZONTAL_FOV = 60
+FACE_WIDTH_METRES = 0.16
+KIOSK_DISTANCES = (0.4, 1.5)
+TRACKING_REDETECT_INTERVAL = 10
+TRACKING_MIN_SCORE = 0.6
+TRACKING_SEARCH_MARGIN = 0.25
+RECOGNITION_CONFIDENCE = 77
+VOTE_WINDOW = 7
+VOTE_MIN_AGREEMENT = 3
+CAMERA_SOURCE = 0
+KIOSK_COOLDOWN = 300
+KIOSK_MIN_SHIFT = 4 * 3600
+KIOSK_MAX_SHIFT = 16 * 3600
+SHARED_FRAME_SIZE = (640, 480)
+SHARED_FRAME_SLOTS = 8
+RECOGNIZER_PROCESSES = max(1, (os.cpu_count() or 1) - 1)
+INGEST_CHUNK_FRAMES = 300
+INGEST_FRAME_STRIDE = 5
+INGEST_WORKERS = os.cpu_count() or 1
+ATTENDANCE_TYPES = ('Clock in', 'Clock Out')
+WORKING_LOCATIONS = ('SGH', 'NHCS', 'NDCS', 'NCCS', 'Connection One', 'EGH', 'Tampines Plaza', 'SKCH', 'SCH',
+                     'OCH', 'KKH', 'SKH', 'Bedok Polyclinic', 'Sengkang Polyclinic', 'Tampines Polyclinic',
+                     'Punggol Polyclinic', 'Outram Polyclinic', 'Bukit Merah Polyclinic',
+                     'Marine Parade Polyclinic', 'Eunos Polyclinic', 'Pasir Ris Polyclinic')
+CAMERA_READ_TIMEOUT = 2
+
+FACE_DATA_DIR = 'FaceData'
+FACE_DATA_BACKEND = 'jpeg'
+FACE_ARCHIVE_NAME = 'faces.npz'
+FACE_SIZE = 100
+ENROLMENT_TARGET_SAMPLES = 200
+ENROLMENT_SELECTED_SAMPLES = 30
+ENROLMENT_QUALITY_SELECTION = False
+ENROLMENT_MAX_FRAMES = 600
+ENROLMENT_MIN_SHARPNESS = 50
+ENROLMENT_BRIGHTNESS = (50, 205)
+ENROLMENT_MAX_SIMILARITY = 0.96
+IMAGE_WRITE_WORKERS = 2
+IMAGE_WRITE_QUEUE = 32
+LBPH_RADIUS = 1
+LBPH_NEIGHBORS = 8
+LBPH_GRID_X = 8
+LBPH_GRID_Y = 8
+LBPH_MODEL_MAGIC = b'LBPHMDL1'
+LBPH_MODEL_HEADER = struct.Struct('<8s7i')
+LBPH_MODEL_ALIGN = 64
+LBPH_MATCH_BLOCK = 256
+LBPH_PROTOTYPES_PER_EMPLOYEE = 0
+LBPH_MAX_SEGMENTS = 16
+LBPH_COMPACT_TOMBSTONE_RATIO = 0.25
+
 
 class InitiateDatabase:
     def __init__(self, db_file):
@@ -128,10 +213,2090 @@ class InitiateDatabase:
         )
         """)
 
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS face_images(
+            path TEXT PRIMARY KEY,
+            employee_id INTEGER NOT NULL,
+            size INTEGER NOT NULL,
+            sha1 TEXT NOT NULL
+        )
+        """)
+        cursor.execute('CREATE INDEX IF NOT EXISTS face_images_employee ON face_images (employee_id)')
+
         conn.commit()
         conn.close()
 
 
+def lbp_image(gray, radius=LBPH_RADIUS, neighbors=LBPH_NEIGHBORS):
+    # NumPy port of OpenCV's extended LBP operator used by LBPHFaceRecognizer,
+    # including its bilinear sampling and float epsilon comparison.
+    src = np.asarray(gray)
+    rows, cols = src.shape
+    center = src[radius:rows - radius, radius:cols - radius].astype(np.float32)
+    codes = np.zeros(center.shape, np.int32)
+    eps = np.finfo(np.float32).eps
+
+    def shifted(dy, dx):
+        return src[radius + dy:rows - radius + dy, radius + dx:cols - radius + dx].astype(np.float32)
+
+    for n in range(neighbors):
+        x = np.float32(radius * np.cos(2.0 * np.pi * n / float(neighbors)))
+        y = np.float32(-radius * np.sin(2.0 * np.pi * n / float(neighbors)))
+        fx, fy = int(np.floor(x)), int(np.floor(y))
+        cx, cy = int(np.ceil(x)), int(np.ceil(y))
+        ty = y - np.float32(fy)
+        tx = x - np.float32(fx)
+        w1 = (1 - tx) * (1 - ty)
+        w2 = tx * (1 - ty)
+        w3 = (1 - tx) * ty
+        w4 = tx * ty
+        t = w1 * shifted(fy, fx) + w2 * shifted(fy, cx) + w3 * shifted(cy, fx) + w4 * shifted(cy, cx)
+        codes |= ((t > center) | (np.abs(t - center) < eps)).astype(np.int32) << n
+    return codes
+
+
+def normalize_face(gray, box=None, size=FACE_SIZE, equalize=True):
+    # The one face normalization for enrolment, training and recognition: crop the box (if
+    # given) from the grey frame, resize to size x size and equalize.
+    if box is not None:
+        x, y, w, h = box
+        gray = gray[y:y + h, x:x + w]
+    if gray.shape[:2] != (size, size):
+        interpolation = cv2.INTER_AREA if gray.shape[0] > size else cv2.INTER_LINEAR
+        gray = cv2.resize(gray, (size, size), interpolation=interpolation)
+    return cv2.equalizeHist(gray) if equalize else gray
+
+
+class EnrolmentSelector:
+    # Decides which captured faces are worth keeping: sharp (variance of the Laplacian), neither
+    # too dark nor blown out, and not a near-duplicate of a face already kept (cosine similarity
+    # of small zero-mean thumbnails). Faces are canonical-size crops before equalization.
+    # With select=False every face is kept until the target, as take_images always did. Selected
+    # faces differ from each other, so far fewer of them are needed.
+    def __init__(self, target=None, min_sharpness=ENROLMENT_MIN_SHARPNESS,
+                 brightness=ENROLMENT_BRIGHTNESS, max_similarity=ENROLMENT_MAX_SIMILARITY,
+                 select=ENROLMENT_QUALITY_SELECTION):
+        if target is None:
+            target = ENROLMENT_SELECTED_SAMPLES if select else ENROLMENT_TARGET_SAMPLES
+        self.target = target
+        self.min_sharpness = min_sharpness
+        self.brightness = brightness
+        self.max_similarity = max_similarity
+        self.select = select
+        self.thumbnails = []
+        self.seen = 0
+        self.kept = 0
+        self.rejected = Counter()
+
+    @staticmethod
+    def thumbnail(face):
+        thumbnail = cv2.resize(cv2.equalizeHist(face), (24, 24), interpolation=cv2.INTER_AREA)
+        thumbnail = thumbnail.astype(np.float32).ravel()
+        thumbnail -= thumbnail.mean()
+        return thumbnail / (np.linalg.norm(thumbnail) or 1)
+
+    def consider(self, face):
+        self.seen += 1
+        if self.select and not self.acceptable(face):
+            return False
+        self.kept += 1
+        return True
+
+    def acceptable(self, face):
+        if cv2.Laplacian(face, cv2.CV_64F).var() < self.min_sharpness:
+            self.rejected['blurred'] += 1
+            return False
+        if not self.brightness[0] <= face.mean() <= self.brightness[1]:
+            self.rejected['exposure'] += 1
+            return False
+        thumbnail = self.thumbnail(face)
+        if self.thumbnails and np.max(np.vstack(self.thumbnails) @ thumbnail) > self.max_similarity:
+            self.rejected['duplicate'] += 1
+            return False
+        self.thumbnails.append(thumbnail)
+        return True
+
+    def done(self):
+        return self.kept >= self.target
+
+
+class AsyncImageWriter:
+    # Encodes and writes images on a small thread pool so disk latency never stalls the camera
+    # loop (imencode and file writes release the GIL). At most `max_pending` images wait in
+    # memory; beyond that write() blocks. close() flushes and returns (written, failed), and
+    # `saved` lists (path, size, sha1) of every file written.
+    def __init__(self, workers=IMAGE_WRITE_WORKERS, max_pending=IMAGE_WRITE_QUEUE):
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.pending = threading.BoundedSemaphore(max_pending)
+        self.lock = threading.Lock()
+        self.written = 0
+        self.failed = 0
+        self.saved = []
+
+    def write(self, path, image):
+        self.pending.acquire()
+        try:
+            self.executor.submit(self.save, path, image)
+        except RuntimeError:
+            self.pending.release()
+            raise
+
+    def save(self, path, image):
+        record = None
+        try:
+            ok, data = cv2.imencode(os.path.splitext(path)[1], image)
+            if ok:
+                with open(path, 'wb') as f:
+                    f.write(data)
+                record = (path, len(data), hashlib.sha1(data).hexdigest())
+        except (cv2.error, OSError) as e:
+            print(f'Cannot write {path}: {e}')
+        finally:
+            self.pending.release()
+        with self.lock:
+            if record:
+                self.written += 1
+                self.saved.append(record)
+            else:
+                self.failed += 1
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        return self.written, self.failed
+
+
+def lbph_histogram(gray, radius=LBPH_RADIUS, neighbors=LBPH_NEIGHBORS,
+                   grid_x=LBPH_GRID_X, grid_y=LBPH_GRID_Y):
+    num_patterns = 2 ** neighbors
+    histogram = np.zeros(grid_x * grid_y * num_patterns, np.float32)
+    codes = lbp_image(gray, radius, neighbors)
+    rows, cols = codes.shape
+    height, width = rows // grid_y, cols // grid_x
+    if height == 0 or width == 0:
+        return histogram
+
+    cells = codes[:grid_y * height, :grid_x * width]
+    cells = cells.reshape(grid_y, height, grid_x, width).transpose(0, 2, 1, 3)
+    cells = cells.reshape(grid_y * grid_x, height * width)
+    cells = cells + np.arange(grid_y * grid_x)[:, None] * num_patterns
+    counts = np.bincount(cells.ravel(), minlength=histogram.size)
+    histogram[:] = counts * (1.0 / (height * width))
+    return histogram
+
+
+class ChiSquareMatcher:
+    # Blocked, batched nearest-neighbour search with the HISTCMP_CHISQR_ALT distance
+    # LBPHFaceRecognizer.predict uses. The distance is rewritten as
+    #     2 * (sum(h) + sum(q)) - 8 * sum(h * q / (h + q))
+    # so only the bins where the query is non-zero have to be visited.
+    def __init__(self, histograms, labels, excluded=None, block_size=LBPH_MATCH_BLOCK):
+        self.histograms = histograms
+        self.labels = labels
+        self.excluded = excluded
+        self.block_size = block_size
+        self.row_sums = None
+
+    def get_row_sums(self):
+        if self.row_sums is None:
+            row_sums = np.empty(len(self.labels))
+            for start in range(0, len(self.labels), self.block_size):
+                block = self.histograms[start:start + self.block_size]
+                row_sums[start:start + len(block)] = block.sum(axis=1, dtype=np.float64)
+            self.row_sums = row_sums
+        return self.row_sums
+
+    def iter_distances(self, queries, start=0, stop=None):
+        queries = np.atleast_2d(np.asarray(queries, np.float32))
+        stop = len(self.labels) if stop is None else stop
+        query_sums = queries.sum(axis=1, dtype=np.float64)
+        columns = [np.flatnonzero(query) for query in queries]
+        values = [query[cols] for query, cols in zip(queries, columns)]
+
+        for block_start in range(start, stop, self.block_size):
+            block = self.histograms[block_start:min(block_start + self.block_size, stop)]
+            if self.row_sums is not None:
+                row_sums = self.row_sums[block_start:block_start + len(block)]
+            else:
+                row_sums = block.sum(axis=1, dtype=np.float64)
+            overlap = np.empty((len(queries), len(block)))
+            for i, (cols, q) in enumerate(zip(columns, values)):
+                h = np.take(block, cols, axis=1)
+                total = h + q
+                np.multiply(h, q, out=h)
+                np.divide(h, total, out=h)
+                overlap[i] = h.sum(axis=1, dtype=np.float64)
+            distances = 2 * (row_sums + query_sums[:, None]) - 8 * overlap
+            np.maximum(distances, 0, out=distances)
+            if self.excluded is not None:
+                distances[:, self.excluded[block_start:block_start + len(block)]] = np.inf
+            yield block_start, distances
+
+    def distances(self, queries, start=0, stop=None):
+        return np.hstack([block for _, block in self.iter_distances(queries, start, stop)])
+
+    def search(self, queries, k=1, start=0, stop=None):
+        # Returns (labels, distances, sample indices), each (n_queries, k), nearest first.
+        queries = np.atleast_2d(np.asarray(queries, np.float32))
+        if stop is None and start == 0:
+            self.get_row_sums()
+        best_distances = np.zeros((len(queries), 0))
+        best_indices = np.zeros((len(queries), 0), np.int64)
+
+        for block_start, distances in self.iter_distances(queries, start, stop):
+            indices = np.broadcast_to(np.arange(block_start, block_start + distances.shape[1]),
+                                      distances.shape)
+            best_distances = np.hstack((best_distances, distances))
+            best_indices = np.hstack((best_indices, indices))
+            if best_distances.shape[1] > k:
+                keep = np.argpartition(best_distances, k - 1, axis=1)[:, :k]
+                best_distances = np.take_along_axis(best_distances, keep, axis=1)
+                best_indices = np.take_along_axis(best_indices, keep, axis=1)
+
+        order = np.lexsort((best_indices, best_distances), axis=1)
+        best_distances = np.take_along_axis(best_distances, order, axis=1)
+        best_indices = np.take_along_axis(best_indices, order, axis=1)
+        return np.asarray(self.labels)[best_indices], best_distances, best_indices
+
+
+def select_prototypes(histograms, k, max_iter=10):
+    # k-medoids (PAM build + alternate) under the chi-square distance; returns the
+    # sorted row indices of the k most representative histograms.
+    n = len(histograms)
+    if k <= 0 or n <= k:
+        return np.arange(n)
+    distances = ChiSquareMatcher(histograms, np.zeros(n, np.int32)).distances(histograms)
+    distances = (distances + distances.T) / 2
+
+    medoids = [int(distances.sum(axis=1).argmin())]
+    nearest = distances[medoids[0]].copy()
+    while len(medoids) < k:
+        gain = np.maximum(nearest[None, :] - distances, 0).sum(axis=1)
+        gain[medoids] = -1
+        medoids.append(int(gain.argmax()))
+        nearest = np.minimum(nearest, distances[medoids[-1]])
+
+    medoids = np.array(medoids)
+    for _ in range(max_iter):
+        assignment = distances[medoids].argmin(axis=0)
+        updated = medoids.copy()
+        for cluster in range(k):
+            members = np.flatnonzero(assignment == cluster)
+            if len(members):
+                updated[cluster] = members[distances[np.ix_(members, members)].sum(axis=1).argmin()]
+        if np.array_equal(updated, medoids):
+            break
+        medoids = updated
+    return np.sort(medoids)
+
+
+def file_sha1(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def publish_file(temp_path, path):
+    # The temp file is already fsynced; rename it over `path` and fsync the
+    # directory so the rename itself survives a crash.
+    os.replace(temp_path, path)
+    if hasattr(os, 'O_DIRECTORY'):
+        fd = os.open(os.path.dirname(path) or '.', os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+def write_lbph_model(path, labels, blocks):
+    # Header, int32 labels, then the float32 histogram matrix, each section 64-byte
+    # aligned so LBPHModel.load() can memory-map both without copying. The matrix is
+    # streamed from `blocks`, so merging segments never holds them all in memory.
+    # Returns the SHA-1 of the published file.
+    n_bins = LBPH_GRID_X * LBPH_GRID_Y * 2 ** LBPH_NEIGHBORS
+    n_samples = len(labels)
+    labels_offset = LBPHModel.aligned(LBPH_MODEL_HEADER.size)
+    histograms_offset = LBPHModel.aligned(labels_offset + 4 * n_samples)
+    header = LBPH_MODEL_HEADER.pack(LBPH_MODEL_MAGIC, LBPH_RADIUS, LBPH_NEIGHBORS,
+                                    LBPH_GRID_X, LBPH_GRID_Y, n_samples, n_bins,
+                                    histograms_offset)
+    label_bytes = np.ascontiguousarray(labels, '<i4').tobytes()
+    digest = hashlib.sha1()
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'wb') as f:
+        def write(data):
+            f.write(data)
+            digest.update(data)
+
+        write(header.ljust(labels_offset, b'\0'))
+        write(label_bytes.ljust(histograms_offset - labels_offset, b'\0'))
+        for block in blocks:
+            write(np.ascontiguousarray(block, '<f4').tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+    publish_file(temp_path, path)
+    return digest.hexdigest()
+
+
+class LBPHModel:
+    # One model file: training histograms grouped by label, so one employee's
+    # templates are a contiguous slice. Tombstoned labels stay in the file but are
+    # left out of the index and never matched.
+    def __init__(self, histograms, labels, tombstones=()):
+        self.histograms = histograms
+        self.labels = labels
+        self.index = {}
+        excluded = None
+        if len(labels):
+            boundaries = np.flatnonzero(np.diff(labels)) + 1
+            starts = np.concatenate(([0], boundaries))
+            ends = np.concatenate((boundaries, [len(labels)]))
+            for start, end in zip(starts, ends):
+                if int(labels[start]) not in tombstones:
+                    self.index[int(labels[start])] = (int(start), int(end))
+            if tombstones:
+                excluded = np.isin(labels, list(tombstones))
+        self.matcher = ChiSquareMatcher(histograms, labels, excluded)
+
+    @classmethod
+    def from_faces(cls, faces, labels):
+        if not len(faces):
+            return cls.empty()
+        return cls.from_histograms(np.vstack([lbph_histogram(face) for face in faces]), labels)
+
+    @classmethod
+    def from_histograms(cls, histograms, labels):
+        labels = np.asarray(labels, np.int32)
+        order = np.argsort(labels, kind='stable')
+        if not len(order):
+            return cls.empty()
+        return cls(np.ascontiguousarray(histograms[order], np.float32), labels[order])
+
+    @classmethod
+    def from_recognizer(cls, recognizer):
+        histograms = recognizer.getHistograms()
+        labels = np.asarray(recognizer.getLabels(), np.int32).ravel()
+        order = np.argsort(labels, kind='stable')
+        if not len(order):
+            return cls.empty()
+        matrix = np.vstack([np.asarray(histograms[i], np.float32).reshape(1, -1) for i in order])
+        return cls(matrix, labels[order])
+
+    @classmethod
+    def empty(cls):
+        n_bins = LBPH_GRID_X * LBPH_GRID_Y * 2 ** LBPH_NEIGHBORS
+        return cls(np.zeros((0, n_bins), np.float32), np.zeros(0, np.int32))
+
+    @staticmethod
+    def aligned(offset):
+        return -(-offset // LBPH_MODEL_ALIGN) * LBPH_MODEL_ALIGN
+
+    def save(self, path):
+        blocks = (self.histograms[start:start + LBPH_MATCH_BLOCK]
+                  for start in range(0, len(self.labels), LBPH_MATCH_BLOCK))
+        return write_lbph_model(path, self.labels, blocks)
+
+    @classmethod
+    def load(cls, path, tombstones=()):
+        with open(path, 'rb') as f:
+            header = f.read(LBPH_MODEL_HEADER.size)
+        if len(header) < LBPH_MODEL_HEADER.size:
+            raise ValueError(f'{path} is not an LBPH model file')
+        (magic, radius, neighbors, grid_x, grid_y,
+         n_samples, n_bins, histograms_offset) = LBPH_MODEL_HEADER.unpack(header)
+        if magic != LBPH_MODEL_MAGIC:
+            raise ValueError(f'{path} is not an LBPH model file')
+        if (radius, neighbors, grid_x, grid_y) != (LBPH_RADIUS, LBPH_NEIGHBORS,
+                                                   LBPH_GRID_X, LBPH_GRID_Y):
+            raise ValueError(f'{path} was trained with different LBPH parameters')
+        if n_samples == 0:
+            return cls.empty()
+        labels = np.memmap(path, dtype='<i4', mode='r',
+                           offset=cls.aligned(LBPH_MODEL_HEADER.size), shape=(n_samples,))
+        histograms = np.memmap(path, dtype='<f4', mode='r',
+                               offset=histograms_offset, shape=(n_samples, n_bins))
+        return cls(histograms, labels, tombstones)
+
+    def label_counts(self):
+        return [[label, end - start] for label, (start, end) in sorted(self.index.items())]
+
+    def live_blocks(self):
+        for start, end in sorted(self.index.values()):
+            for block_start in range(start, end, LBPH_MATCH_BLOCK):
+                yield self.histograms[block_start:min(block_start + LBPH_MATCH_BLOCK, end)]
+
+    def live_labels(self):
+        spans = sorted(self.index.values())
+        if not spans:
+            return np.zeros(0, np.int32)
+        return np.concatenate([self.labels[start:end] for start, end in spans])
+
+    def compress(self, k):
+        keep = []
+        for start, end in sorted(self.index.values()):
+            keep.extend(start + select_prototypes(self.histograms[start:end], k))
+        keep = np.array(keep, np.int64)
+        return LBPHModel(np.ascontiguousarray(self.histograms[keep]), self.labels[keep])
+
+
+class SegmentedLBPHModel:
+    # What the recognition code queries: every live segment of the model store,
+    # searched one after the other with the results merged.
+    def __init__(self, segments, sources=None, version=0):
+        self.segments = segments
+        self.sources = sources or {}
+        self.version = version
+        self.index = {}
+        for segment in segments:
+            for label in segment.index:
+                self.index[label] = segment
+
+    def find_segment(self, label):
+        try:
+            return self.index.get(int(label))
+        except (TypeError, ValueError):
+            return None
+
+    def predict(self, face):
+        # Drop-in for LBPHFaceRecognizer.predict: nearest neighbour by chi-square.
+        labels, distances = self.predict_batch([face])
+        return labels[0], distances[0]
+
+    def predict_batch(self, faces, k=1):
+        if not self.index:
+            return [-1] * len(faces), [float('inf')] * len(faces)
+        queries = np.vstack([lbph_histogram(face) for face in faces])
+        all_labels = []
+        all_distances = []
+        for segment in self.segments:
+            if segment.index:
+                labels, distances, _ = segment.matcher.search(queries, k)
+                all_labels.append(labels)
+                all_distances.append(distances)
+        labels = np.hstack(all_labels)
+        distances = np.hstack(all_distances)
+        order = np.argsort(distances, axis=1, kind='stable')[:, :k]
+        labels = np.take_along_axis(labels, order, axis=1)
+        distances = np.take_along_axis(distances, order, axis=1)
+        labels[np.isinf(distances)] = -1
+        if k == 1:
+            return [int(label) for label in labels[:, 0]], [float(d) for d in distances[:, 0]]
+        return labels, distances
+
+    def templates(self, label):
+        segment = self.find_segment(label)
+        if segment is None:
+            return None
+        start, end = segment.index[int(label)]
+        return segment.histograms[start:end]
+
+    def verify(self, face, label):
+        segment = self.find_segment(label)
+        if segment is None:
+            return None
+        start, end = segment.index[int(label)]
+        return float(segment.matcher.distances(lbph_histogram(face), start, end).min())
+
+
+class LBPHModelStore:
+    # Enrolments are appended as immutable segment files listed in a JSON manifest,
+    # so enrolling one employee never re-reads anyone else's data. Deleting an
+    # employee only tombstones their label; segments are merged once tombstones or
+    # the segment count pile up.
+    #
+    # Every change publishes a new manifest version: segment files are written to a
+    # temp name, fsynced and renamed, and only then is the manifest (version, label
+    # and sample counts, per-segment SHA-1) atomically replaced. A reader therefore
+    # sees either the old model or the new one, and a failed train leaves the
+    # previous version in place.
+    #
+    # Writers (training processes, deletes from the Tk app, migrations) take an
+    # exclusive lock on Classifier/manifest.lock and re-read the manifest under it,
+    # so two of them never reuse a segment number or drop each other's tombstones.
+    def __init__(self, model_dir=CLASSIFIER_DIR):
+        self.model_dir = model_dir
+        self.manifest_path = os.path.join(model_dir, CLASSIFIER_MANIFEST)
+        self.lock_path = os.path.join(model_dir, CLASSIFIER_LOCK)
+        self.thread_lock = threading.RLock()
+        self.lock_file = None
+        self.lock_depth = 0
+
+    def segment_path(self, name):
+        return os.path.join(self.model_dir, name)
+
+    @contextmanager
+    def lock(self):
+        # Re-entrant within a thread; the file lock is held from the outermost entry.
+        with self.thread_lock:
+            if not self.lock_depth:
+                os.makedirs(self.model_dir, exist_ok=True)
+                self.lock_file = open(self.lock_path, 'a+b')
+                if fcntl:
+                    fcntl.flock(self.lock_file.fileno(), fcntl.LOCK_EX)
+                else:
+                    while True:
+                        try:
+                            self.lock_file.seek(0)
+                            msvcrt.locking(self.lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                            break
+                        except OSError:
+                            pass  # LK_LOCK gives up after ten seconds
+            self.lock_depth += 1
+            try:
+                yield
+            finally:
+                self.lock_depth -= 1
+                if not self.lock_depth:
+                    if fcntl:
+                        fcntl.flock(self.lock_file.fileno(), fcntl.LOCK_UN)
+                    else:
+                        self.lock_file.seek(0)
+                        msvcrt.locking(self.lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+                    self.lock_file.close()
+                    self.lock_file = None
+
+    def migrate_legacy_model(self):
+        if os.path.isfile(self.manifest_path):
+            return
+        with self.lock():
+            self.migrate_legacy_model_locked()
+
+    def migrate_legacy_model_locked(self):
+        if os.path.isfile(self.manifest_path):
+            return
+        model_path = self.segment_path(LEGACY_CLASSIFIER_MODEL)
+        yaml_path = self.segment_path(LEGACY_CLASSIFIER_YAML)
+        try:
+            if not os.path.isfile(model_path) and os.path.isfile(yaml_path):
+                recognizer = cv2.face.LBPHFaceRecognizer_create()
+                recognizer.read(yaml_path)
+                LBPHModel.from_recognizer(recognizer).save(model_path)
+                print(f"Converted: {yaml_path} -> {model_path}")
+            if os.path.isfile(model_path):
+                model = LBPHModel.load(model_path)
+                self.write_manifest({'version': 0, 'next_segment': 1, 'segments': [
+                    {'file': LEGACY_CLASSIFIER_MODEL, 'sha1': file_sha1(model_path),
+                     'labels': model.label_counts(), 'tombstones': []}]})
+        except (OSError, ValueError, cv2.error) as e:
+            print("Error while converting classifier:", e)
+
+    def read_manifest(self):
+        self.migrate_legacy_model()
+        try:
+            with open(self.manifest_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {'version': 0, 'next_segment': 1, 'segments': []}
+
+    def write_manifest(self, manifest):
+        os.makedirs(self.model_dir, exist_ok=True)
+        live = {label: count for entry in manifest['segments']
+                for label, count in entry['labels'] if label not in entry['tombstones']}
+        manifest['version'] = manifest.get('version', 0) + 1
+        manifest['label_count'] = len(live)
+        manifest['sample_count'] = sum(live.values())
+        temp_path = f"{self.manifest_path}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        publish_file(temp_path, self.manifest_path)
+
+    @staticmethod
+    def segment_key(entry):
+        return entry['file'], tuple(sorted(entry['tombstones']))
+
+    def load(self, manifest=None, previous=None):
+        # Segment files are immutable, so ones the previous model already mapped
+        # (with the same tombstones) are reused along with their cached row sums.
+        # Checksums are not read here: hashing every segment would cost a full read of
+        # the model on each start. See verify().
+        manifest = manifest or self.read_manifest()
+        reusable = previous.sources if previous is not None else {}
+        sources = {}
+        for entry in manifest['segments']:
+            key = self.segment_key(entry)
+            segment = reusable.get(key)
+            if segment is None:
+                segment = LBPHModel.load(self.segment_path(entry['file']), set(entry['tombstones']))
+            sources[key] = segment
+        return SegmentedLBPHModel(list(sources.values()), sources, manifest.get('version', 0))
+
+    def verify(self, entries=None):
+        # (file, problem) for every segment that is missing or does not match its manifest
+        # checksum.
+        problems = []
+        for entry in self.read_manifest()['segments'] if entries is None else entries:
+            path = self.segment_path(entry['file'])
+            if not os.path.isfile(path):
+                problems.append((entry['file'], 'missing'))
+            elif entry.get('sha1') and file_sha1(path) != entry['sha1']:
+                problems.append((entry['file'], 'checksum mismatch'))
+        return problems
+
+    def write_segment(self, manifest, labels, blocks):
+        os.makedirs(self.model_dir, exist_ok=True)
+        name = f"segment-{manifest['next_segment']:06d}.lbph"
+        manifest['next_segment'] += 1
+        checksum = write_lbph_model(self.segment_path(name), labels, blocks)
+        counts = np.unique(np.asarray(labels), return_counts=True)
+        return {'file': name, 'sha1': checksum,
+                'labels': [[int(label), int(count)] for label, count in zip(*counts)],
+                'tombstones': []}
+
+    @staticmethod
+    def tombstone(manifest, labels):
+        for entry in manifest['segments']:
+            for label, _ in entry['labels']:
+                if label in labels and label not in entry['tombstones']:
+                    entry['tombstones'].append(label)
+
+    def append(self, model):
+        with self.lock():
+            manifest = self.read_manifest()
+            self.tombstone(manifest, set(model.index))
+            manifest['segments'].append(self.write_segment(manifest, model.live_labels(), model.live_blocks()))
+            self.merge(manifest)
+
+    def append_blocks(self, labels, blocks):
+        # Like append(), for a segment streamed from histogram blocks in label order.
+        with self.lock():
+            manifest = self.read_manifest()
+            self.tombstone(manifest, {int(label) for label in labels})
+            manifest['segments'].append(self.write_segment(manifest, labels, blocks))
+            self.merge(manifest)
+
+    def remove(self, label):
+        with self.lock():
+            manifest = self.read_manifest()
+            self.tombstone(manifest, {int(label)})
+            self.merge(manifest)
+
+    def compact(self, force=False):
+        with self.lock():
+            self.merge(self.read_manifest(), force)
+
+    def merge(self, manifest, force=False):
+        # Caller holds lock() and read `manifest` under it.
+        segments = manifest['segments']
+        sizes = [sum(count for _, count in entry['labels']) for entry in segments]
+        dead = sum(count for entry in segments for label, count in entry['labels']
+                   if label in entry['tombstones'])
+
+        merge = []
+        if force and (len(segments) > 1 or dead):
+            merge = segments
+        elif sum(sizes) and dead / sum(sizes) > LBPH_COMPACT_TOMBSTONE_RATIO:
+            merge = segments
+        elif len(segments) > LBPH_MAX_SEGMENTS:
+            merge = segments[1:] if sizes[0] > sum(sizes[1:]) else segments
+
+        # Merging reads every input in full anyway, so it is where a corrupt segment is kept from
+        # being copied into a new file with a fresh, valid checksum.
+        problems = self.verify(merge) if merge and MODEL_VERIFY_CHECKSUMS else []
+        for name, problem in problems:
+            print(f"Error while merging model segments: {name}: {problem}")
+        if problems:
+            merge = []
+        if merge:
+            models = [LBPHModel.load(self.segment_path(entry['file']), set(entry['tombstones']))
+                      for entry in merge]
+            labels = np.concatenate([model.live_labels() for model in models])
+            kept = [entry for entry in segments if entry not in merge]
+            if len(labels):
+                blocks = (block for model in models for block in model.live_blocks())
+                kept.append(self.write_segment(manifest, labels, blocks))
+            manifest['segments'] = kept
+        self.write_manifest(manifest)
+
+        for entry in merge:
+            try:
+                os.remove(self.segment_path(entry['file']))
+            except OSError as e:
+                print("Error while removing model segment:", e)
+
+
+def load_gray_image(path):
+    image = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+    if image is None:
+        raise ValueError(f'Cannot read image {path}')
+    return image
+
+
+def load_histograms(paths, chunk_size=TRAINING_CHUNK_SIZE, workers=TRAINING_WORKERS):
+    # Decodes and histograms images on a thread pool (imread and the NumPy LBP
+    # kernels release the GIL) and yields (offset, histograms) one chunk at a time,
+    # so no more than chunk_size decoded frames are alive at once.
+    def histogram(path):
+        return lbph_histogram(normalize_face(load_gray_image(path)))
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for start in range(0, len(paths), chunk_size):
+            yield start, np.vstack(list(executor.map(histogram, paths[start:start + chunk_size])))
+
+
+def write_face_archive(path, faces):
+    # One employee's enrolment as a single compressed (n, FACE_SIZE, FACE_SIZE) uint8 array,
+    # published atomically. Returns (size, sha1) for the face_images table.
+    temp_path = f'{path}.tmp'
+    with open(temp_path, 'wb') as f:
+        np.savez_compressed(f, faces=np.asarray(faces, np.uint8))
+        f.flush()
+        os.fsync(f.fileno())
+    publish_file(temp_path, path)
+    return os.path.getsize(path), file_sha1(path)
+
+
+def load_face_archive(path):
+    with np.load(path) as archive:
+        return archive['faces']
+
+
+def is_face_archive(path):
+    return path.endswith('.npz')
+
+
+class LBPHFeatureCache:
+    # Per-image LBPH histograms keyed by path, mtime and size, so retraining only
+    # decodes enrolment images that are new or have been overwritten.
+    def __init__(self, db_file=FEATURE_CACHE_PATH):
+        self.db_file = db_file
+        self.params = f'{FACE_SIZE}:{LBPH_RADIUS}:{LBPH_NEIGHBORS}:{LBPH_GRID_X}:{LBPH_GRID_Y}'
+
+    def connect(self):
+        os.makedirs(os.path.dirname(self.db_file) or '.', exist_ok=True)
+        conn = sqlite3.connect(self.db_file)
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS image_features(
+            path TEXT PRIMARY KEY,
+            mtime_ns INTEGER NOT NULL,
+            size INTEGER NOT NULL,
+            params TEXT NOT NULL,
+            histogram BLOB NOT NULL
+        )
+        """)
+        return conn
+
+    def histograms(self, paths, progress=None):
+        n_bins = LBPH_GRID_X * LBPH_GRID_Y * 2 ** LBPH_NEIGHBORS
+        result = np.empty((len(paths), n_bins), np.float32)
+        keys = []
+        for path in paths:
+            stat = os.stat(path)
+            keys.append((os.path.abspath(path), stat.st_mtime_ns, stat.st_size, self.params))
+
+        missing = []
+        with self.connect() as conn:
+            cursor = conn.cursor()
+            for i, key in enumerate(keys):
+                cursor.execute('SELECT histogram FROM image_features WHERE path = ? '
+                               'AND mtime_ns = ? AND size = ? AND params = ?', key)
+                row = cursor.fetchone()
+                if row:
+                    result[i] = np.frombuffer(row[0], '<f4')
+                else:
+                    missing.append(i)
+            if progress:
+                progress(len(paths) - len(missing), len(paths))
+
+            for start, chunk in load_histograms([paths[i] for i in missing]):
+                rows = missing[start:start + len(chunk)]
+                result[rows] = chunk
+                cursor.executemany('INSERT OR REPLACE INTO image_features '
+                                   '(path, mtime_ns, size, params, histogram) VALUES (?, ?, ?, ?, ?)',
+                                   [keys[i] + (result[i].astype('<f4').tobytes(),) for i in rows])
+                conn.commit()
+                if progress:
+                    progress(len(paths) - len(missing) + start + len(chunk), len(paths))
+        conn.close()
+        return result
+
+    def archive_histograms(self, path):
+        # Same cache, one row per archive holding the histograms of every face in it.
+        n_bins = LBPH_GRID_X * LBPH_GRID_Y * 2 ** LBPH_NEIGHBORS
+        stat = os.stat(path)
+        key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size, self.params)
+        with self.connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT histogram FROM image_features WHERE path = ? '
+                           'AND mtime_ns = ? AND size = ? AND params = ?', key)
+            row = cursor.fetchone()
+            if row:
+                histograms = np.frombuffer(row[0], '<f4').reshape(-1, n_bins)
+            else:
+                faces = load_face_archive(path)
+                histograms = np.zeros((len(faces), n_bins), np.float32)
+                for i, face in enumerate(faces):
+                    histograms[i] = lbph_histogram(normalize_face(face))
+                cursor.execute('INSERT OR REPLACE INTO image_features '
+                               '(path, mtime_ns, size, params, histogram) VALUES (?, ?, ?, ?, ?)',
+                               key + (histograms.astype('<f4').tobytes(),))
+                conn.commit()
+        conn.close()
+        return histograms
+
+    def discard(self, paths):
+        with self.connect() as conn:
+            cursor = conn.cursor()
+            cursor.executemany('DELETE FROM image_features WHERE path = ?',
+                               [(os.path.abspath(path),) for path in paths])
+            conn.commit()
+        conn.close()
+
+
+def training_histograms(paths, labels, progress=None):
+    # Loose images go through the per-image cache in one batch; each archive is one
+    # sequential read. Returns (histograms, labels) with one row per face.
+    images = [i for i, path in enumerate(paths) if not is_face_archive(path)]
+    archives = [i for i, path in enumerate(paths) if is_face_archive(path)]
+    blocks, block_labels = [], []
+    if images:
+        blocks.append(feature_cache.histograms([paths[i] for i in images], progress))
+        block_labels.append([labels[i] for i in images])
+    for done, i in enumerate(archives, 1):
+        blocks.append(feature_cache.archive_histograms(paths[i]))
+        block_labels.append([labels[i]] * len(blocks[-1]))
+        if progress:
+            progress(done, len(archives))
+    if not blocks:
+        return np.zeros((0, LBPH_GRID_X * LBPH_GRID_Y * 2 ** LBPH_NEIGHBORS), np.float32), []
+    return np.vstack(blocks), [label for block in block_labels for label in block]
+
+
+def retrain_employees(paths, labels):
+    # Retrains every listed employee into one new segment without holding all their histograms:
+    # the first pass fills the feature cache one employee at a time and counts the rows, the
+    # second streams them back from the cache into the segment file.
+    groups = {}
+    for path, label in zip(paths, labels):
+        groups.setdefault(int(label), []).append(path)
+    row_labels = []
+    for label in sorted(groups):
+        row_labels.extend(training_histograms(groups[label], [label] * len(groups[label]))[1])
+    blocks = (training_histograms(groups[label], [label] * len(groups[label]))[0] for label in sorted(groups))
+    face_model_store.append_blocks(row_labels, blocks)
+
+
+class TrainingCancelled(Exception):
+    pass
+
+
+def run_training_job(images, labels, messages, cancel_event):
+    # Runs in the training process: every step is reported on `messages` as
+    # (kind, text, done, total) and the cancel event is checked between chunks.
+    def report(text, done, total):
+        if cancel_event.is_set():
+            raise TrainingCancelled()
+        messages.put(('progress', text, done, total))
+
+    try:
+        report('Loading images', 0, len(images))
+        histograms, labels = training_histograms(
+            images, labels, lambda done, total: report('Computing histograms', done, total))
+        model = LBPHModel.from_histograms(histograms, labels)
+        if LBPH_PROTOTYPES_PER_EMPLOYEE:
+            report('Selecting prototypes', 0, 1)
+            model = model.compress(LBPH_PROTOTYPES_PER_EMPLOYEE)
+        report('Writing model', 0, 1)
+        face_model_store.append(model)
+        messages.put(('done', 'Model written', 1, 1))
+    except TrainingCancelled:
+        messages.put(('cancelled', 'Training cancelled', 0, 0))
+    except Exception as e:
+        messages.put(('error', str(e), 0, 0))
+
+
+def remove_face_model(employee_id, deleted_images):
+    try:
+        face_model_store.remove(employee_id)
+        feature_cache.discard(deleted_images)
+    except (OSError, ValueError, sqlite3.Error) as e:
+        print("Error while removing face model:", e)
+
+
+class TrainingJob:
+    # Enrolment training in a separate process, so the Tk window keeps running.
+    # The screen that started it drains progress messages with root.after.
+    def __init__(self, employee_id, images, labels):
+        self.employee_id = employee_id
+        self.messages = multiprocessing.Queue()
+        self.cancel_event = multiprocessing.Event()
+        self.finished = False
+        self.process = multiprocessing.Process(target=run_training_job,
+                                               args=(images, labels, self.messages, self.cancel_event),
+                                               daemon=True)
+
+    def start(self):
+        self.process.start()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def poll(self):
+        updates = []
+        while True:
+            try:
+                updates.append(self.messages.get_nowait())
+            except queue.Empty:
+                break
+        if any(update[0] != 'progress' for update in updates):
+            self.finished = True
+            self.process.join()
+        elif not self.process.is_alive() and not updates:
+            self.finished = True
+            updates.append(('error', f'Training process exited with code {self.process.exitcode}', 0, 0))
+        return updates
+
+
+def expected_face_size(distance, frame_width, fov=CAMERA_HORIZONTAL_FOV, face_width=FACE_WIDTH_METRES):
+    # Pinhole estimate of a face's width in pixels at `distance` metres, with the focal length
+    # derived from the frame width so it holds at any capture resolution.
+    focal_length = frame_width / (2 * np.tan(np.radians(fov) / 2))
+    return int(focal_length * face_width / distance)
+
+
+class FaceDetector:
+    # Runs the Haar cascade on a downscaled, equalized copy of the frame and maps the
+    # boxes back to full resolution, so faces are cropped from the original frame.
+    # Face size bounds are in full-resolution pixels (0 = unbounded) and scaled with the
+    # frame. A kiosk passes `distances` (nearest, farthest, in metres) instead, and the bounds
+    # follow from the frame width.
+    def __init__(self, cascade, scale=DETECTION_SCALE, scale_factor=DETECTION_SCALE_FACTOR,
+                 min_neighbors=DETECTION_MIN_NEIGHBORS, min_size=0, max_size=0, distances=None):
+        self.cascade = cascade
+        self.scale = scale
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.min_size = min_size
+        self.max_size = max_size
+        self.distances = distances
+
+    def prepare(self, gray):
+        small = gray
+        if self.scale != 1:
+            small = cv2.resize(gray, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+        return cv2.equalizeHist(small)
+
+    def detect_prepared(self, small):
+        min_size, max_size = self.min_size, self.max_size
+        if self.distances:
+            width = small.shape[1] / self.scale
+            nearest, farthest = self.distances
+            min_size, max_size = expected_face_size(farthest, width), expected_face_size(nearest, width)
+        min_size, max_size = int(min_size * self.scale), int(max_size * self.scale)
+        boxes = self.cascade.detectMultiScale(small, self.scale_factor, self.min_neighbors,
+                                              minSize=(min_size, min_size), maxSize=(max_size, max_size))
+        return [tuple(int(v) for v in box) for box in boxes]
+
+    def to_frame(self, boxes, shape):
+        rows, cols = shape[:2]
+        faces = []
+        for (x, y, w, h) in boxes:
+            x, y = int(x / self.scale), int(y / self.scale)
+            w, h = min(int(w / self.scale), cols - x), min(int(h / self.scale), rows - y)
+            faces.append((x, y, w, h))
+        return faces
+
+    def detect(self, gray):
+        return self.to_frame(self.detect_prepared(self.prepare(gray)), gray.shape)
+
+
+class FaceTracker:
+    # Follows detected faces with template matching on the detector's downscaled frame, and
+    # only reruns the cascade every `redetect_interval` frames or when a face is lost.
+    def __init__(self, detector, redetect_interval=TRACKING_REDETECT_INTERVAL,
+                 min_score=TRACKING_MIN_SCORE, search_margin=TRACKING_SEARCH_MARGIN):
+        self.detector = detector
+        self.redetect_interval = redetect_interval
+        self.min_score = min_score
+        self.search_margin = search_margin
+        self.tracks = []
+        self.frames_since_detection = 0
+        self.frames = 0
+        self.detections = 0
+
+    def reset(self):
+        self.tracks = []
+
+    def update(self, gray):
+        small = self.detector.prepare(gray)
+        self.frames += 1
+        boxes = None
+        if self.tracks and self.frames_since_detection < self.redetect_interval:
+            boxes = self.follow(small)
+        if boxes is None:
+            boxes = self.detector.detect_prepared(small)
+            self.tracks = [(box, small[box[1]:box[1] + box[3], box[0]:box[0] + box[2]].copy())
+                           for box in boxes]
+            self.frames_since_detection = 0
+            self.detections += 1
+        else:
+            self.frames_since_detection += 1
+        return self.detector.to_frame(boxes, gray.shape)
+
+    def follow(self, small):
+        rows, cols = small.shape[:2]
+        tracks = []
+        for (x, y, w, h), template in self.tracks:
+            margin_x, margin_y = max(1, int(w * self.search_margin)), max(1, int(h * self.search_margin))
+            left, top = max(0, x - margin_x), max(0, y - margin_y)
+            window = small[top:min(rows, y + h + margin_y), left:min(cols, x + w + margin_x)]
+            if window.shape[0] < h or window.shape[1] < w:
+                return None
+            scores = cv2.matchTemplate(window, template, cv2.TM_CCOEFF_NORMED)
+            _, score, _, (dx, dy) = cv2.minMaxLoc(scores)
+            if score < self.min_score:
+                return None
+            tracks.append(((left + dx, top + dy, w, h), template))
+        self.tracks = tracks
+        return [box for box, _ in tracks]
+
+
+class FrameSource:
+    # Anything the enrolment and recognition loops can read BGR frames from. `fps` paces read()
+    # and `loop` restarts finite sources when they run out.
+    def __init__(self, fps=None, loop=False):
+        self.fps = fps
+        self.loop = loop
+        self.next_frame_at = None
+
+    def read(self):
+        self.throttle()
+        ret, frame = self.read_frame()
+        if not ret and self.loop and self.rewind():
+            ret, frame = self.read_frame()
+        return ret, frame
+
+    def throttle(self):
+        if not self.fps:
+            return
+        now = time.perf_counter()
+        if self.next_frame_at is not None and now < self.next_frame_at:
+            time.sleep(self.next_frame_at - now)
+            now = self.next_frame_at
+        self.next_frame_at = now + 1 / self.fps
+
+    def read_frame(self):
+        raise NotImplementedError
+
+    def rewind(self):
+        return False
+
+    def release(self):
+        pass
+
+
+class DeviceSource(FrameSource):
+    def __init__(self, index=0, fps=None, loop=False):
+        super().__init__(fps, loop)
+        self.capture = cv2.VideoCapture(index)
+
+    def read_frame(self):
+        return self.capture.read()
+
+    def release(self):
+        self.capture.release()
+
+
+class VideoFileSource(DeviceSource):
+    def rewind(self):
+        return self.capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+
+
+class ImageDirectorySource(FrameSource):
+    def __init__(self, directory, fps=None, loop=False):
+        super().__init__(fps, loop)
+        self.paths = sorted(path for path in glob.glob(os.path.join(directory, '**', '*'), recursive=True)
+                            if path.lower().endswith(('.jpg', '.jpeg', '.png', '.bmp')))
+        self.index = 0
+
+    def read_frame(self):
+        while self.index < len(self.paths):
+            frame = cv2.imread(self.paths[self.index])
+            self.index += 1
+            if frame is not None:
+                return True, frame
+        return False, None
+
+    def rewind(self):
+        self.index = 0
+        return bool(self.paths)
+
+
+def synthetic_face(identity, sample=0, size=200):
+    # A drawn face the Haar cascade detects. Its geometry depends on `identity` and its pixel
+    # noise on `sample`, so synthetic enrolments of one identity differ like real captures.
+    shape = np.random.default_rng(identity)
+    noise = np.random.default_rng((identity, sample))
+    face = np.full((size, size), 60, np.uint8)
+    centre = size // 2
+    skin = int(shape.integers(150, 210))
+    cv2.ellipse(face, (centre, centre), (int(size * 0.36), int(size * 0.46)), 0, 0, 360, skin, -1)
+    eye_y = int(size * (0.38 + shape.uniform(-0.03, 0.03)))
+    eye_x = int(size * (0.16 + shape.uniform(-0.02, 0.03)))
+    for side in (-1, 1):
+        cv2.ellipse(face, (centre + side * eye_x, eye_y - int(size * 0.08)),
+                    (int(size * 0.1), int(size * 0.025)), 0, 0, 360, 50, -1)
+        cv2.ellipse(face, (centre + side * eye_x, eye_y), (int(size * 0.07), int(size * 0.04)), 0, 0, 360, 40, -1)
+    cv2.line(face, (centre, eye_y + 10), (centre, int(size * 0.6)), skin - 50, max(2, size // 40))
+    mouth_y = int(size * (0.72 + shape.uniform(-0.03, 0.03)))
+    cv2.ellipse(face, (centre, mouth_y), (int(size * (0.12 + shape.uniform(0, 0.05))), int(size * 0.03)),
+                0, 0, 360, 70, -1)
+    face = np.clip(face + noise.integers(-10, 11, face.shape), 0, 255).astype(np.uint8)
+    return cv2.GaussianBlur(face, (5, 5), 0)
+
+
+class SyntheticSource(FrameSource):
+    # Deterministic frames for headless runs: `faces` (grey images, e.g. from FaceData) are pasted
+    # in turn, `hold` frames each, onto a fixed textured background and drift slowly, so tracking
+    # has something to do.
+    def __init__(self, faces=None, size=(640, 480), face_size=200, frames=None, hold=30, seed=0,
+                 fps=None, loop=False):
+        super().__init__(fps, loop)
+        rng = np.random.default_rng(seed)
+        width, height = size
+        self.background = cv2.GaussianBlur(rng.integers(0, 256, (height, width), dtype=np.uint8), (9, 9), 0)
+        if not faces:
+            faces = [synthetic_face(seed, size=face_size)]
+        self.faces = [cv2.resize(face, (face_size, face_size)) for face in faces]
+        self.frames = frames
+        self.hold = hold
+        self.index = 0
+
+    def read_frame(self):
+        if self.frames is not None and self.index >= self.frames:
+            return False, None
+        rows, cols = self.background.shape
+        face = self.faces[self.index // self.hold % len(self.faces)]
+        size = face.shape[0]
+        x = (cols - size) // 2 + int((cols - size) / 4 * np.sin(self.index / 25))
+        y = (rows - size) // 2 + int((rows - size) / 4 * np.sin(self.index / 40))
+        frame = self.background.copy()
+        frame[y:y + size, x:x + size] = face
+        self.index += 1
+        return True, cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
+
+    def rewind(self):
+        self.index = 0
+        return True
+
+
+def open_frame_source(source, fps=None, loop=False):
+    # A camera index, 'synthetic', a directory of stills, or a video file.
+    if isinstance(source, int) or str(source).isdigit():
+        return DeviceSource(int(source), fps, loop)
+    if source == 'synthetic':
+        return SyntheticSource(fps=fps, loop=loop)
+    if os.path.isdir(source):
+        return ImageDirectorySource(source, fps, loop)
+    return VideoFileSource(source, fps, loop)
+
+
+class FrameGrabber:
+    # Reads a frame source on its own thread into a one-slot buffer, so a slow consumer always gets
+    # the newest frame instead of one queued in the driver. Frames overwritten before being read
+    # are counted in `dropped`.
+    def __init__(self, source=CAMERA_SOURCE):
+        self.source = source
+        self.capture = None
+        self.frame = None
+        self.sequence = 0
+        self.delivered = 0
+        self.grabbed = 0
+        self.dropped = 0
+        self.condition = threading.Condition()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.capture = self.source if isinstance(self.source, FrameSource) else open_frame_source(self.source)
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        return self
+
+    def run(self):
+        while not self.stop_event.is_set():
+            ret, frame = self.capture.read()
+            if not ret:
+                break
+            with self.condition:
+                if self.frame is not None and self.sequence > self.delivered:
+                    self.dropped += 1
+                self.frame = frame
+                self.sequence += 1
+                self.grabbed += 1
+                self.condition.notify_all()
+        with self.condition:
+            self.stop_event.set()
+            self.condition.notify_all()
+
+    def read(self, timeout=CAMERA_READ_TIMEOUT):
+        with self.condition:
+            self.condition.wait_for(lambda: self.sequence > self.delivered or self.stop_event.is_set(),
+                                    timeout)
+            if self.sequence == self.delivered:
+                return False, None
+            self.delivered = self.sequence
+            return True, self.frame
+
+    def release(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+        if self.capture is not None:
+            self.capture.release()
+
+
+def match_confidence(distance):
+    return int((100 * (1 - distance / 300)))
+
+
+def recognize_faces(gray_img, boxes, clf, employee_id=None):
+    # The recognition step every camera path shares: the canonical crop of each detected box,
+    # then a 1:N prediction, or a 1:1 check against `employee_id`. Returns
+    # [(box, label, distance)].
+    matches = []
+    for (x, y, w, h) in boxes:
+        face = normalize_face(gray_img, (x, y, w, h))
+        if employee_id is None:
+            id, predict = clf.predict(face)
+        else:
+            id, predict = employee_id, clf.verify(face, employee_id)
+        matches.append(((x, y, w, h), int(id), float(predict)))
+    return matches
+
+
+class IdentityVoter:
+    # Collects per-frame (label, distance) matches over a sliding window and decides as soon as
+    # `min_votes` frames in the window accept the same label, so one bad frame decides nothing.
+    def __init__(self, window=VOTE_WINDOW, min_votes=VOTE_MIN_AGREEMENT, threshold=RECOGNITION_CONFIDENCE):
+        self.results = deque(maxlen=window)
+        self.min_votes = min_votes
+        self.threshold = threshold
+        self.started = None
+        self.frames = 0
+        self.decision_latency = None
+        self.frames_to_decision = None
+
+    def reset(self):
+        self.results.clear()
+        self.started = None
+        self.frames = 0
+
+    def add(self, label, distance):
+        if self.started is None:
+            self.started = time.perf_counter()
+        self.frames += 1
+        self.results.append((label, match_confidence(distance)))
+
+        votes = Counter(label for label, confidence in self.results if confidence > self.threshold)
+        if not votes:
+            return None
+        label, count = votes.most_common(1)[0]
+        if count < self.min_votes:
+            return None
+        self.decision_latency = time.perf_counter() - self.started
+        self.frames_to_decision = self.frames
+        self.reset()
+        return label
+
+
+class FaceModelRegistry:
+    # Keeps one face cascade and one memory-mapped LBPH model per process, so opening
+    # the camera does not re-read the classifier. A watcher thread reloads the model
+    # in the background when the manifest's mtime changes and it names a new version.
+    # The camera loops fetch the model every frame, so a swap needs no restart.
+    def __init__(self, cascade_path=CASCADE_PATH, store=None,
+                 reload_interval=MODEL_RELOAD_INTERVAL):
+        self.cascade_path = cascade_path
+        self.store = store or LBPHModelStore()
+        self.reload_interval = reload_interval
+        self.cascade = None
+        self.model = None
+        self.file_stamp = None
+        self.reset_after_fork()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self.reset_after_fork)
+
+    def reset_after_fork(self):
+        # A forked child inherits the watcher attribute but not its thread, and may inherit a lock
+        # some other thread was holding, so it starts over with its own.
+        self.lock = threading.Lock()
+        self.reload_lock = threading.Lock()
+        self.watcher = None
+        self.stop_event = threading.Event()
+
+    def get_cascade(self):
+        with self.lock:
+            if self.cascade is None:
+                self.cascade = cv2.CascadeClassifier(self.cascade_path)
+            return self.cascade
+
+    def get_model(self):
+        if self.model is None:
+            self.reload()
+        self.start_watcher()
+        return self.model
+
+    def preload(self):
+        threading.Thread(target=self.warm_up, daemon=True).start()
+
+    def warm_up(self):
+        self.get_cascade()
+        self.get_model()
+
+    def start_watcher(self):
+        with self.lock:
+            if self.watcher is not None:
+                return
+            self.watcher = threading.Thread(target=self.watch, daemon=True)
+            self.watcher.start()
+
+    def stop_watcher(self):
+        self.stop_event.set()
+
+    def watch(self):
+        while not self.stop_event.wait(self.reload_interval):
+            self.reload()
+
+    def stat_classifier(self):
+        try:
+            stat = os.stat(self.store.manifest_path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def reload(self, force=False):
+        with self.reload_lock:
+            self.store.migrate_legacy_model()
+            stamp = self.stat_classifier()
+            if stamp is None:
+                with self.lock:
+                    self.model = None
+                    self.file_stamp = None
+                return False
+            if stamp == self.file_stamp and not force:
+                return False
+
+            try:
+                manifest = self.store.read_manifest()
+                if self.model is not None and manifest.get('version') == self.model.version and not force:
+                    self.file_stamp = stamp
+                    return False
+                previous = self.model
+                model = self.store.load(manifest, previous)
+            except (OSError, ValueError, KeyError) as e:
+                print("Error while loading classifier:", e)
+                return False
+
+            with self.lock:
+                self.model = model
+                self.file_stamp = stamp
+            fresh = [entry for entry in manifest['segments']
+                     if previous is None or self.store.segment_key(entry) not in previous.sources]
+            if MODEL_VERIFY_CHECKSUMS and fresh:
+                threading.Thread(target=self.verify, args=(model, previous, fresh), daemon=True).start()
+            return True
+
+    def verify(self, model, previous, entries):
+        # Checksums of newly mapped segments are read after the swap, so a clock-in never waits
+        # on hashing the model. A segment that fails puts the previous model back.
+        problems = self.store.verify(entries)
+        for name, problem in problems:
+            print(f"Error while verifying classifier: {name}: {problem}")
+        if problems:
+            with self.lock:
+                if self.model is model:
+                    self.model = previous
+
+
+class FaceDataStore:
+    # Enrolment images live in one folder per employee (FaceData/<id>/<n>.jpg) and are listed
+    # in the face_images table with their size and SHA-1, so training, deletion and integrity
+    # checks never have to scan or parse the image folders.
+    def __init__(self, root=FACE_DATA_DIR, db_file='employees.db'):
+        self.root = root
+        self.db_file = db_file
+
+    def employee_dir(self, employee_id):
+        return os.path.join(self.root, str(int(employee_id)))
+
+    def image_path(self, employee_id, number):
+        return os.path.join(self.employee_dir(employee_id), f'{number}.jpg')
+
+    def archive_path(self, employee_id):
+        return os.path.join(self.employee_dir(employee_id), FACE_ARCHIVE_NAME)
+
+    def stage_dir(self, employee_id):
+        # A new capture is written here first and only replaces the old images once it succeeded.
+        return f'{self.employee_dir(employee_id)}.new'
+
+    def discard_stage(self, employee_id):
+        shutil.rmtree(self.stage_dir(employee_id), ignore_errors=True)
+
+    def replace(self, employee_id, records):
+        # Swaps the employee's images for the staged (path, size, sha1) records and returns the
+        # paths that were deleted.
+        deleted = self.remove(employee_id)
+        os.makedirs(self.employee_dir(employee_id), exist_ok=True)
+        moved = []
+        for path, size, sha1 in records:
+            target = os.path.join(self.employee_dir(employee_id), os.path.basename(path))
+            os.replace(path, target)
+            moved.append((target, size, sha1))
+        self.register(employee_id, moved)
+        self.discard_stage(employee_id)
+        return deleted
+
+    def write_archive(self, employee_id, faces):
+        os.makedirs(self.employee_dir(employee_id), exist_ok=True)
+        path = self.archive_path(employee_id)
+        size, sha1 = write_face_archive(path, faces)
+        self.register(employee_id, [(path, size, sha1)])
+        return path
+
+    def pack(self, employee_id):
+        # Replaces an employee's loose JPEGs with one archive of the same decoded pixels, so
+        # the trained model does not change.
+        paths = [path for path in self.images(employee_id)[0] if not is_face_archive(path)]
+        if not paths:
+            return 0
+        faces = [load_gray_image(path) for path in paths]
+        if os.path.exists(self.archive_path(employee_id)):
+            faces = list(load_face_archive(self.archive_path(employee_id))) + faces
+        self.write_archive(employee_id, faces)
+        with sqlite3.connect(self.db_file) as conn:
+            cursor = conn.cursor()
+            cursor.executemany('DELETE FROM face_images WHERE path = ?', [(path,) for path in paths])
+            conn.commit()
+        conn.close()
+        for path in paths:
+            os.remove(path)
+        return len(paths)
+
+    def register(self, employee_id, records):
+        with sqlite3.connect(self.db_file) as conn:
+            cursor = conn.cursor()
+            cursor.executemany('INSERT OR REPLACE INTO face_images (path, employee_id, size, sha1) '
+                               'VALUES (?, ?, ?, ?)',
+                               [(path, int(employee_id), size, sha1) for path, size, sha1 in records])
+            conn.commit()
+        conn.close()
+
+    def register_files(self, employee_id, paths):
+        self.register(employee_id, [(path, os.path.getsize(path), file_sha1(path)) for path in paths])
+
+    def records(self, employee_id=None):
+        with sqlite3.connect(self.db_file) as conn:
+            cursor = conn.cursor()
+            if employee_id is None:
+                cursor.execute('SELECT path, employee_id, size, sha1 FROM face_images ORDER BY employee_id, path')
+            else:
+                cursor.execute('SELECT path, employee_id, size, sha1 FROM face_images WHERE employee_id = ? '
+                               'ORDER BY path', (int(employee_id),))
+            rows = cursor.fetchall()
+        conn.close()
+        return rows
+
+    def images(self, employee_id=None):
+        rows = self.records(employee_id)
+        return [row[0] for row in rows], [row[1] for row in rows]
+
+    def remove(self, employee_id):
+        paths, _ = self.images(employee_id)
+        deleted = []
+        for path in paths:
+            try:
+                os.remove(path)
+                deleted.append(path)
+            except FileNotFoundError:
+                pass
+        with sqlite3.connect(self.db_file) as conn:
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM face_images WHERE employee_id = ?', (int(employee_id),))
+            conn.commit()
+        conn.close()
+        try:
+            os.rmdir(self.employee_dir(employee_id))
+        except OSError:
+            pass
+        return deleted
+
+    def verify(self, employee_id=None):
+        problems = []
+        for path, _, size, sha1 in self.records(employee_id):
+            if not os.path.exists(path):
+                problems.append((path, 'missing'))
+            elif os.path.getsize(path) != size:
+                problems.append((path, 'size mismatch'))
+            elif file_sha1(path) != sha1:
+                problems.append((path, 'checksum mismatch'))
+        return problems
+
+    def migrate_flat_layout(self):
+        # Moves FaceData/{Name}.{id}.{n}.jpg files into the per-employee folders and registers them.
+        moved = {}
+        for path in sorted(glob.glob(os.path.join(self.root, '*.jpg'))):
+            parts = os.path.basename(path).split('.')
+            if len(parts) != 4 or not parts[1].isdigit():
+                print(f'Skipping {path}: not an enrolment image name')
+                continue
+            employee_id = int(parts[1])
+            os.makedirs(self.employee_dir(employee_id), exist_ok=True)
+            number = len(os.listdir(self.employee_dir(employee_id))) + 1
+            while os.path.exists(self.image_path(employee_id, number)):
+                number += 1
+            target = self.image_path(employee_id, number)
+            try:
+                os.replace(path, target)
+            except FileNotFoundError:
+                # Another process starting at the same time moved it first.
+                continue
+            moved.setdefault(employee_id, []).append(target)
+        for employee_id, paths in moved.items():
+            self.register_files(employee_id, paths)
+        return sum(len(paths) for paths in moved.values())
+
+
+face_model_store = LBPHModelStore()
+feature_cache = LBPHFeatureCache()
+face_models = FaceModelRegistry(store=face_model_store)
+face_data = FaceDataStore()
+
+
+class EmployeeDirectory:
+    # In-memory employee_id -> (name, face_id status, department) map for the
+    # recognition loop. Screens that change employee rows call invalidate().
+    def __init__(self, db_file='employees.db'):
+        self.db_file = db_file
+        self.employees = None
+        self.lock = threading.Lock()
+
+    def load(self):
+        with sqlite3.connect(self.db_file) as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT employee_id, name, face_id, department FROM employees')
+            rows = cursor.fetchall()
+        conn.close()
+        return {row[0]: (row[1], row[2], row[3]) for row in rows}
+
+    def preload(self):
+        with self.lock:
+            if self.employees is None:
+                self.employees = self.load()
+
+    def get(self, employee_id):
+        try:
+            employee_id = int(employee_id)
+        except (TypeError, ValueError):
+            return None
+        self.preload()
+        return self.employees.get(employee_id)
+
+    def invalidate(self):
+        with self.lock:
+            self.employees = None
+
+
+employee_directory = EmployeeDirectory()
+
+
+def record_attendance(employee_id, attendance_type, location, date, time_stamp):
+    with sqlite3.connect('employees.db') as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+                INSERT INTO attendance (employee_id,
+                attendance_type, location, date, time)
+                VALUES (?, ?, ?, ?, ?)""",
+                       (employee_id, attendance_type,
+                        location, date, time_stamp))
+        conn.commit()
+    conn.close()
+
+
+class SharedFrameRing:
+    # Fixed-size BGR frame slots in one shared memory block. Processes pass slot numbers around
+    # and read frames as NumPy views, so pixels are never pickled. Frames of another size are
+    # resized into the slot.
+    def __init__(self, slots=SHARED_FRAME_SLOTS, size=SHARED_FRAME_SIZE, name=None):
+        width, height = size
+        self.shape = (height, width, 3)
+        self.slots = slots
+        self.frame_bytes = height * width * 3
+        if name is None:
+            self.memory = shared_memory.SharedMemory(create=True, size=slots * self.frame_bytes)
+        else:
+            self.memory = shared_memory.SharedMemory(name=name)
+        self.name = self.memory.name
+
+    def frame(self, slot):
+        return np.ndarray(self.shape, np.uint8, self.memory.buf, slot * self.frame_bytes)
+
+    def write(self, slot, img):
+        target = self.frame(slot)
+        if img.shape == self.shape:
+            np.copyto(target, img)
+        else:
+            cv2.resize(img, (self.shape[1], self.shape[0]), dst=target, interpolation=cv2.INTER_AREA)
+
+    def close(self):
+        self.memory.close()
+
+    def unlink(self):
+        self.memory.unlink()
+
+
+def run_frame_capture(source, fps, ring_name, slots, size, frames, free_slots, stop_event, recognizers,
+                      captured, dropped):
+    # Capture process: copies each frame into a free slot and queues (slot, sequence, timestamp).
+    # When every slot is still being recognized the frame is dropped, never queued. Ctrl+C is
+    # left to the parent, which stops capture through stop_event.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    ring = SharedFrameRing(slots, size, ring_name)
+    capture = source if isinstance(source, FrameSource) else open_frame_source(source, fps)
+    try:
+        while not stop_event.is_set():
+            ret, img = capture.read()
+            if not ret:
+                break
+            try:
+                slot = free_slots.get_nowait()
+            except queue.Empty:
+                dropped.value += 1
+                continue
+            ring.write(slot, img)
+            captured.value += 1
+            frames.put((slot, captured.value, time.time()))
+    finally:
+        capture.release()
+        for _ in range(recognizers):
+            frames.put(None)
+        ring.close()
+
+
+def run_frame_recognizer(ring_name, slots, size, frames, free_slots, results):
+    # Recognizer process: hands the slot back as soon as the frame is converted to grey, then
+    # detects (or tracks) and predicts every face and queues (sequence, timestamp, model version,
+    # [(box, label, distance)]).
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    ring = SharedFrameRing(slots, size, ring_name)
+    tracker = FaceTracker(FaceDetector(face_models.get_cascade(), distances=KIOSK_DISTANCES))
+    clf = face_models.get_model()
+    face_models.start_watcher()
+    while True:
+        item = frames.get()
+        if item is None:
+            break
+        slot, sequence, ts = item
+        gray_img = cv2.cvtColor(ring.frame(slot), cv2.COLOR_BGR2GRAY)
+        free_slots.put(slot)
+
+        clf = face_models.get_model() or clf
+        results.put((sequence, ts, clf.version, recognize_faces(gray_img, tracker.update(gray_img), clf)))
+    face_models.stop_watcher()
+    results.put(None)
+    ring.close()
+
+
+class SharedFramePipeline:
+    # Capture and recognition in separate processes around a SharedFrameRing. Only slot numbers
+    # and per-frame match lists cross process boundaries.
+    def __init__(self, source=CAMERA_SOURCE, fps=None, recognizers=RECOGNIZER_PROCESSES,
+                 slots=SHARED_FRAME_SLOTS, size=SHARED_FRAME_SIZE):
+        self.source = source
+        self.fps = fps
+        self.recognizers = recognizers
+        self.slots = max(slots, recognizers + 1)
+        self.size = size
+        self.ring = None
+        self.processes = []
+
+    def start(self):
+        self.ring = SharedFrameRing(self.slots, self.size)
+        self.frames = multiprocessing.Queue()
+        self.free_slots = multiprocessing.Queue()
+        self.results_queue = multiprocessing.Queue()
+        for slot in range(self.slots):
+            self.free_slots.put(slot)
+        self.stop_event = multiprocessing.Event()
+        self.captured = multiprocessing.Value('l', 0)
+        self.dropped = multiprocessing.Value('l', 0)
+
+        self.processes = [multiprocessing.Process(
+            target=run_frame_recognizer, daemon=True,
+            args=(self.ring.name, self.slots, self.size, self.frames, self.free_slots, self.results_queue))
+            for _ in range(self.recognizers)]
+        self.processes.append(multiprocessing.Process(
+            target=run_frame_capture, daemon=True,
+            args=(self.source, self.fps, self.ring.name, self.slots, self.size, self.frames, self.free_slots,
+                  self.stop_event, self.recognizers, self.captured, self.dropped)))
+        for process in self.processes:
+            process.start()
+        return self
+
+    def results(self):
+        finished = 0
+        while finished < self.recognizers:
+            item = self.results_queue.get()
+            if item is None:
+                finished += 1
+                continue
+            yield item
+
+    def stop(self):
+        self.stop_event.set()
+        # Keep draining results so no recognizer blocks on a full pipe while we wait for it.
+        for process in self.processes:
+            while process.is_alive():
+                try:
+                    self.results_queue.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            process.join()
+        self.ring.close()
+        self.ring.unlink()
+        print(f'Shared frame pipeline: {self.captured.value} frames captured, {self.dropped.value} dropped')
+
+
+class AttendanceKiosk:
+    # Unattended 1:N clock-in terminal: keeps the camera and model loaded, recognizes whoever is
+    # closest to the camera and records them at most once per `cooldown` seconds. Without a fixed
+    # attendance type it alternates Clock in / Clock Out from the employee's last row within
+    # `max_shift` seconds, so overnight shifts clock out across midnight, but only clocks out once
+    # `min_shift` seconds have passed since the clock-in, so walking past the kiosk again during a
+    # shift records nothing. A clock-in older than `max_shift` is taken as a missed clock-out.
+    def __init__(self, location, source=CAMERA_SOURCE, attendance_type=None, cooldown=KIOSK_COOLDOWN,
+                 show=True, fps=None, recognizers=0, min_shift=KIOSK_MIN_SHIFT, max_shift=KIOSK_MAX_SHIFT):
+        self.location = location
+        self.source = source
+        self.fps = fps
+        self.recognizers = recognizers
+        self.attendance_type = attendance_type
+        self.cooldown = cooldown
+        self.min_shift = min_shift
+        self.max_shift = max_shift
+        self.show = show
+        self.last_recorded = {}
+        self.recorded = 0
+
+    def next_attendance_type(self, employee_id, ts):
+        # None when the employee clocked in less than min_shift ago.
+        if self.attendance_type:
+            return self.attendance_type
+        # Dates are stored as text, so select every day the shift window touches and check the time.
+        dates = sorted({datetime.fromtimestamp(t).strftime('%d-%m-%Y')
+                        for t in [*range(int(ts - self.max_shift), int(ts), 86400), ts]})
+        with sqlite3.connect('employees.db') as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'SELECT attendance_type, date, time FROM attendance WHERE employee_id = ? '
+                           f'AND date IN ({",".join("?" * len(dates))}) ORDER BY attendance_id DESC LIMIT 1',
+                           (employee_id, *dates))
+            last = cursor.fetchone()
+        conn.close()
+        if not last or last[0] != 'Clock in':
+            return 'Clock in'
+        clocked_in = datetime.strptime(f'{last[1]} {last[2]}', '%d-%m-%Y %H:%M:%S').timestamp()
+        if ts - clocked_in > self.max_shift:
+            return 'Clock in'
+        if ts - clocked_in < self.min_shift:
+            return None
+        return 'Clock Out'
+
+    def record(self, employee_id, name):
+        now = time.monotonic()
+        last = self.last_recorded.get(employee_id)
+        if last is not None and now - last < self.cooldown:
+            return None
+        ts = time.time()
+        date = datetime.fromtimestamp(ts).strftime('%d-%m-%Y')
+        time_stamp = datetime.fromtimestamp(ts).strftime('%H:%M:%S')
+        attendance_type = self.next_attendance_type(employee_id, ts)
+        if attendance_type is None:
+            self.last_recorded[employee_id] = now
+            return None
+        record_attendance(employee_id, attendance_type, self.location, date, time_stamp)
+        self.last_recorded[employee_id] = now
+        self.recorded += 1
+        print(f'{date} {time_stamp} {self.location}: {attendance_type} for {name} ({employee_id})')
+        return attendance_type
+
+    def observe(self, voter, id, predict):
+        employee = employee_directory.get(id)
+        decision = voter.add(id, predict) if employee else None
+        if decision is None:
+            return employee, None
+        return employee, self.record(decision, employee[0])
+
+    def run(self):
+        if self.recognizers:
+            return self.run_shared()
+        tracker = FaceTracker(FaceDetector(face_models.get_cascade(), distances=KIOSK_DISTANCES))
+        voter = IdentityVoter()
+        clf = face_models.get_model()
+        if clf is None:
+            print('No face model found, please enrol employees first.')
+            return
+        face_models.start_watcher()
+        employee_directory.preload()
+        model_version = clf.version
+        banner = ''
+
+        source = self.source if isinstance(self.source, FrameSource) else open_frame_source(self.source, self.fps)
+        cam = FrameGrabber(source).start()
+        try:
+            while True:
+                ret, img = cam.read()
+                if not ret:
+                    break
+                clf = face_models.get_model() or clf
+                if clf.version != model_version:
+                    model_version = clf.version
+                    employee_directory.invalidate()
+
+                gray_img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+                features = tracker.update(gray_img)
+                if not features:
+                    voter.reset()
+                    banner = ''
+                else:
+                    (x, y, w, h), id, predict = recognize_faces(
+                        gray_img, [max(features, key=lambda box: box[2] * box[3])], clf)[0]
+                    employee, attendance_type = self.observe(voter, id, predict)
+                    if attendance_type:
+                        banner = f'{attendance_type}: {employee[0]}'
+                    if self.show:
+                        name = employee[0] if employee and match_confidence(predict) > RECOGNITION_CONFIDENCE \
+                            else 'Unknown'
+                        cv2.rectangle(img, (x, y), (x + w, y + h), (0, 255, 0), 3)
+                        cv2.putText(img, name, (x, y + h), cv2.FONT_HERSHEY_COMPLEX, 0.8, (255, 255, 255), 3)
+
+                if self.show:
+                    cv2.putText(img, banner or self.location, (20, 40), cv2.FONT_HERSHEY_COMPLEX, 1,
+                                (0, 255, 0), 2)
+                    cv2.imshow('Attendance Kiosk', img)
+                    if cv2.waitKey(1) & 0xFF == ord('q'):
+                        break
+        except KeyboardInterrupt:
+            pass
+        finally:
+            cam.release()
+            face_models.stop_watcher()
+            if self.show:
+                cv2.destroyAllWindows()
+        print(f'Kiosk stopped: {self.recorded} attendance rows recorded, '
+              f'{cam.grabbed} frames grabbed, {cam.dropped} dropped')
+
+    def run_shared(self):
+        # Capture and recognition run in their own processes; this one only votes and records,
+        # so there is no preview window.
+        if face_models.get_model() is None:
+            print('No face model found, please enrol employees first.')
+            return
+        voter = IdentityVoter()
+        employee_directory.preload()
+        model_version = None
+
+        pipeline = SharedFramePipeline(self.source, self.fps, self.recognizers).start()
+        try:
+            for sequence, ts, version, matches in pipeline.results():
+                if version != model_version:
+                    model_version = version
+                    employee_directory.invalidate()
+                if not matches:
+                    voter.reset()
+                    continue
+                box, id, predict = max(matches, key=lambda match: match[0][2] * match[0][3])
+                self.observe(voter, id, predict)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            pipeline.stop()
+        print(f'Kiosk stopped: {self.recorded} attendance rows recorded')
+
+
+def list_ingest_chunks(paths, chunk_frames=INGEST_CHUNK_FRAMES):
+    # Splits recordings into independent units of work. Videos are cut into frame ranges and are
+    # assumed to end at their modification time; stills are timestamped with their own mtime.
+    chunks = []
+    for path in paths:
+        if os.path.isdir(path):
+            stills = ImageDirectorySource(path).paths
+            for start in range(0, len(stills), chunk_frames):
+                chunks.append(('images', [(still, os.path.getmtime(still))
+                                          for still in stills[start:start + chunk_frames]]))
+            continue
+        capture = cv2.VideoCapture(path)
+        frames = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+        fps = capture.get(cv2.CAP_PROP_FPS) or 30
+        capture.release()
+        started = os.path.getmtime(path) - frames / fps
+        for start in range(0, frames, chunk_frames):
+            chunks.append(('video', path, start, min(start + chunk_frames, frames), started, fps))
+    return chunks
+
+
+def init_ingest_worker():
+    # Module-level so the pool can pickle it under spawn; a bound registry method would drag its
+    # locks along.
+    face_models.warm_up()
+
+
+def ingest_chunk(chunk, stride=INGEST_FRAME_STRIDE):
+    # Runs in a worker process: the same detect, predict and confidence check as
+    # capture_attendance, returning (employee_id, timestamp) sightings. Video frames go through
+    # the multi-frame voter; a still is its own evidence.
+    detector = FaceDetector(face_models.get_cascade())
+    clf = face_models.get_model()
+    sightings = []
+
+    def recognize(img):
+        gray_img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        return recognize_faces(gray_img, detector.detect(gray_img), clf)
+
+    if chunk[0] == 'images':
+        for path, ts in chunk[1]:
+            img = cv2.imread(path)
+            if img is None:
+                continue
+            for _, id, predict in recognize(img):
+                if match_confidence(predict) > RECOGNITION_CONFIDENCE:
+                    sightings.append((int(id), ts))
+        return sightings
+
+    _, path, start, stop, started, fps = chunk
+    voter = IdentityVoter()
+    capture = cv2.VideoCapture(path)
+    capture.set(cv2.CAP_PROP_POS_FRAMES, start)
+    for index in range(start, stop):
+        if not capture.grab():
+            break
+        if (index - start) % stride:
+            continue
+        ret, img = capture.retrieve()
+        if not ret:
+            break
+        matches = recognize(img)
+        if not matches:
+            voter.reset()
+        for _, id, predict in matches:
+            decision = voter.add(int(id), predict)
+            if decision is not None:
+                sightings.append((decision, started + index / fps))
+    capture.release()
+    return sightings
+
+
+def select_attendance_rows(sightings, location, attendance_type):
+    # One row per employee per day: the earliest sighting for a clock-in, the latest for a
+    # clock-out, skipping employees and days that already have that row for this location.
+    first = attendance_type == 'Clock in'
+    chosen = {}
+    for employee_id, ts in sightings:
+        key = (employee_id, datetime.fromtimestamp(ts).strftime('%d-%m-%Y'))
+        if key not in chosen or (ts < chosen[key] if first else ts > chosen[key]):
+            chosen[key] = ts
+
+    with sqlite3.connect('employees.db') as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT employee_id, date FROM attendance WHERE attendance_type = ? AND location = ?',
+                       (attendance_type, location))
+        existing = set(cursor.fetchall())
+    conn.close()
+
+    rows = []
+    for (employee_id, date), ts in sorted(chosen.items(), key=lambda item: item[1]):
+        if (employee_id, date) in existing or not employee_directory.get(employee_id):
+            continue
+        rows.append((employee_id, attendance_type, location, date,
+                     datetime.fromtimestamp(ts).strftime('%H:%M:%S')))
+    return rows
+
+
+def ingest_recordings(paths, location, attendance_type='Clock in', workers=INGEST_WORKERS,
+                      stride=INGEST_FRAME_STRIDE):
+    # Loaded (and a legacy model migrated) once here, so the workers only ever read the store.
+    if face_models.get_model() is None:
+        print('No face model found, please enrol employees first.')
+        return []
+    chunks = list_ingest_chunks(paths)
+    sightings = []
+    with ProcessPoolExecutor(workers, initializer=init_ingest_worker) as pool:
+        for done, found in enumerate(pool.map(ingest_chunk, chunks, [stride] * len(chunks)), 1):
+            sightings.extend(found)
+            print(f'Ingest: {done}/{len(chunks)} chunks, {len(sightings)} sightings')
+
+    rows = select_attendance_rows(sightings, location, attendance_type)
+    with sqlite3.connect('employees.db') as conn:
+        cursor = conn.cursor()
+        cursor.executemany("""
+                INSERT INTO attendance (employee_id,
+                attendance_type, location, date, time)
+                VALUES (?, ?, ?, ?, ?)""", rows)
+        conn.commit()
+    conn.close()
+    print(f'Ingest: {len(rows)} attendance rows recorded for {location}')
+    return rows
+
+
+def migrate_face_data(size=FACE_SIZE):
+    # Moves a flat FaceData folder into per-employee folders, rewrites stored images at the
+    # canonical size and retrains everyone from them, so the model matches what recognition
+    # now feeds it.
+    moved = face_data.migrate_flat_layout()
+    print(f'FaceData: {moved} images moved into per-employee folders')
+
+    paths, labels = face_data.images()
+    resized = {}
+    for path, label in zip(paths, labels):
+        if is_face_archive(path):
+            continue
+        image = load_gray_image(path)
+        if image.shape == (size, size):
+            continue
+        temp_path = f'{path}.tmp.jpg'
+        cv2.imwrite(temp_path, normalize_face(image, size=size))
+        os.replace(temp_path, path)
+        resized.setdefault(label, []).append(path)
+    for label, label_paths in resized.items():
+        face_data.register_files(label, label_paths)
+    print(f'FaceData: {sum(map(len, resized.values()))} of {len(paths)} images resized to {size}x{size}')
+
+    if moved or resized:
+        retrain_employees(paths, labels)
+        print(f'Model retrained for {len(set(labels))} employees')
+    return moved, resized
+
+
+def pack_face_data():
+    packed = 0
+    employees = sorted(set(face_data.images()[1]))
+    for employee_id in employees:
+        packed += face_data.pack(employee_id)
+    print(f'FaceData: {packed} images packed into archives for {len(employees)} employees')
+    return packed
+
+
+def compact_model():
+    before = face_model_store.read_manifest()
+    face_model_store.compact(force=True)
+    after = face_model_store.read_manifest()
+    print(f"Model: {len(before['segments'])} segments merged into {len(after['segments'])}, "
+          f"{after.get('sample_count', 0)} samples for {after.get('label_count', 0)} employees")
+
+
+def check_face_data():
+    problems = face_data.verify()
+    for path, problem in problems:
+        print(f'{path}: {problem}')
+    print(f'FaceData: {len(face_data.records())} images listed, {len(problems)} problems')
+    model_problems = face_model_store.verify()
+    for name, problem in model_problems:
+        print(f'{face_model_store.segment_path(name)}: {problem}')
+    print(f"Model: {len(face_model_store.read_manifest()['segments'])} segments, {len(model_problems)} problems")
+    return problems + model_problems
+
+
 class MainFrame:
     def __init__(self, root):
         self.root = root
@@ -1964,6 +4129,7 @@ class AttendanceManagement(MainFrame):
         super().__init__(root)
         self.employeeID = employeeID
         self.is_admin = is_admin
+        face_models.preload()
         self.initialize_widgets()
 
     def initialize_widgets(self):
@@ -2122,12 +4288,7 @@ class AttendanceManagement(MainFrame):
                                            font=('Calibri', 14),
                                            width=17, state='readonly', justify=CENTER
                                            )
-        self.combo_location['value'] = ('Select Working Location', 'SGH', 'NHCS', 'NDCS', 'NCCS',
-                                        'Connection One', 'EGH', 'Tampines Plaza', 'SKCH', 'SCH',
-                                        'OCH', 'KKH', 'SKH', 'Bedok Polyclinic', 'Sengkang Polyclinic',
-                                        'Tampines Polyclinic', 'Punggol Polyclinic', 'Outram Polyclinic',
-                                        'Bukit Merah Polyclinic', 'Marine Parade Polyclinic', 'Eunos Polyclinic',
-                                        'Pasir Ris Polyclinic')
+        self.combo_location['value'] = ('Select Working Location',) + WORKING_LOCATIONS
         self.combo_location.current(0)
         self.combo_location.place(x=180, y=200, width=265, height=30)
 
@@ -2153,81 +4314,76 @@ class AttendanceManagement(MainFrame):
                 messagebox.showerror('Error', 'Data Missing! Please register Face ID!')
                 return
 
-        def draw_boundary(img, classifier, scaleFactor, minNeighbours, color, text, clf):
+        def draw_boundary(img, tracker, color, text, clf):
             attendance_marked = False
             gray_img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-            gray_img = cv2.equalizeHist(gray_img)
-            features = classifier.detectMultiScale(gray_img, scaleFactor, minNeighbours)
+            features = tracker.update(gray_img)
+            if not features:
+                voter.reset()
 
             coordinate = []
 
-            for (x, y, w, h) in features:
+            verify_id = int(employee_id) if ATTENDANCE_VERIFICATION_MODE else None
+            for (x, y, w, h), id, predict in recognize_faces(gray_img, features, clf, verify_id):
                 cv2.rectangle(img, (x, y), (x + w, y + h), (0, 255, 0), 3)
-                id, predict = clf.predict(gray_img[y:y + h, x:x + w])
-                confidence = int((100 * (1 - predict / 300)))
-                conn = sqlite3.connect('employees.db')
-                cursor = conn.cursor()
-                cursor.execute('SELECT name FROM employees '
-                               'WHERE employee_id = ?', (id,))
-                result = cursor.fetchone()
-                if not result:
+                confidence = match_confidence(predict)
+                employee = employee_directory.get(id)
+                if not employee:
                     continue
-                result = "+".join(result)
+                result = employee[0]
+                decision = voter.add(id, predict)
 
-                if confidence > 77:
-                    employee_name = result
+                if confidence > RECOGNITION_CONFIDENCE:
                     cv2.putText(img, f'{result}', (x, y + h),
                                 cv2.FONT_HERSHEY_COMPLEX, 0.8, (255, 255, 255),
                                 3)
-                    cv2.imshow("Taking Attendance", img)
-                    cv2.waitKey(1000)
-                    if str(id) == employee_id:
-                        try:
-                            cursor.execute("""
-                                    INSERT INTO attendance (employee_id,
-                                    attendance_type, location, date, time)
-                                    VALUES (?, ?, ?, ?, ?)""",
-                                           (employee_id, attendance_type,
-                                            location, date, time_stamp))
-                            conn.commit()
-                            messagebox.showinfo('Attendance',
-                                                f'Attendance for {employee_name} marked successfully!')
-                            attendance_marked = True
-                            self.fetch_data()
-                            break
-                        except Exception as e:
-                            print("Error while marking attendance:", e)
-                    else:
-                        messagebox.showerror('Wrong Employee',
-                                             'The recognized face '
-                                             'does not match the current logged-in employee.')
-                        return None, False
                 else:
-                    # count = datetime.now()
-                    cv2.imshow("Taking Attendance", img)
-                    cv2.rectangle(img, (x, y), (x + w, y + h), (0, 255, 0), 3)
                     cv2.putText(img, 'Unknown', (x, y + h), cv2.FONT_HERSHEY_COMPLEX,
                                 0.8, (255, 255, 255), 3)
-                    cv2.imshow("Taking Attendance", img)
+                cv2.imshow("Taking Attendance", img)
                 coordinate = [x, y, w, h]
-                conn.close()
+
+                if decision is None:
+                    continue
+                if ATTENDANCE_VERIFICATION_MODE:
+                    # The 1:1 votes only say the face is close enough to this employee; one 1:N
+                    # check on the deciding frame still turns away someone closer to another
+                    # enrolled employee.
+                    _, decision, _ = recognize_faces(gray_img, [(x, y, w, h)], clf)[0]
+                if str(decision) == employee_id:
+                    try:
+                        record_attendance(employee_id, attendance_type, location, date, time_stamp)
+                        messagebox.showinfo('Attendance',
+                                            f'Attendance for {employee_directory.get(decision)[0]} '
+                                            f'marked successfully!')
+                        attendance_marked = True
+                        self.fetch_data()
+                        break
+                    except Exception as e:
+                        print("Error while marking attendance:", e)
+                else:
+                    messagebox.showerror('Wrong Employee',
+                                         'The recognized face '
+                                         'does not match the current logged-in employee.')
+                    return None, False
             return coordinate, attendance_marked
 
-        def recognize(img, clf, face_cascade):
-            coordinate, marked = draw_boundary(img, face_cascade, 1.2, 5,
-                                               (255, 255, 255), 'Face', clf)
+        def recognize(img, clf, tracker):
+            coordinate, marked = draw_boundary(img, tracker, (255, 255, 255), 'Face', clf)
             if marked or coordinate is None:
                 return None
             return img
 
-        face_cascade = cv2.CascadeClassifier("haarcascade_frontalface_default.xml")
-        clf = cv2.face.LBPHFaceRecognizer_create()
-
-        exists = os.path.isfile("Classifier/Classifier.yml")
+        tracker = FaceTracker(FaceDetector(face_models.get_cascade()))
+        voter = IdentityVoter()
+        clf = face_models.get_model()
+        employee_directory.preload()
 
-        if exists:
-            clf.read("Classifier/Classifier.yml")
-        else:
+        if clf is None:
+            messagebox.showerror('Data Missing',
+                                 'Please register face ID!')
+            return
+        if ATTENDANCE_VERIFICATION_MODE and clf.templates(employee_id) is None:
             messagebox.showerror('Data Missing',
                                  'Please register face ID!')
             return
@@ -2236,11 +4392,17 @@ class AttendanceManagement(MainFrame):
         date = datetime.fromtimestamp(ts).strftime('%d-%m-%Y')
         time_stamp = datetime.fromtimestamp(ts).strftime('%H:%M:%S')
 
-        cam = cv2.VideoCapture(0)
+        cam = FrameGrabber().start()
 
+        frames = 0
+        camera_failed = False
         while True:
             ret, img = cam.read()
-            img = recognize(img, clf, face_cascade)
+            if not ret:
+                camera_failed = True
+                break
+            frames += 1
+            img = recognize(img, face_models.get_model() or clf, tracker)
             if img is None:
                 break
             cv2.imshow("Taking Attendance", img)
@@ -2248,6 +4410,10 @@ class AttendanceManagement(MainFrame):
                 break
         cam.release()
         cv2.destroyAllWindows()
+        if camera_failed:
+            messagebox.showerror('Camera Error',
+                                 'The camera stopped sending frames.' if frames else
+                                 'Cannot read from the camera. Please check that it is connected.')
 
     def get_logged_in_employee_name(self, frame):
         with sqlite3.connect('employees.db') as conn:
@@ -2384,6 +4550,7 @@ class EmployeeManagement(MainFrame):
         self.var_com_text_search = StringVar()
         self.var_text_search = StringVar()
         self.var_is_admin = IntVar()
+        self.training_job = None
 
         self.employee_mgmt_fm = Frame(self.root, highlightbackground=BG_COLOR,
                                       highlightthickness=3)
@@ -2679,6 +4846,9 @@ class EmployeeManagement(MainFrame):
                                  bg=BG_COLOR, fg=FG_COLOR, command=self.train_images)
         confirm_img_btn.place(x=25, y=300, width=170, height=45)
 
+        self.cancel_training_btn = Button(self.face_id_fm, text='Cancel Training', font=('Calibri', 13, 'bold'),
+                                          bg='red', fg=FG_COLOR, command=self.cancel_training)
+
         self.search_fm = LabelFrame(self.table_fm, bd=3, relief=RIDGE,
                                     text='Search Employee',
                                     font=('Calibri', 10, 'bold'),
@@ -2802,47 +4972,88 @@ class EmployeeManagement(MainFrame):
             messagebox.showerror('Error', 'Please select an employee first!')
             return
 
-        face_classifier = cv2.CascadeClassifier("haarcascade_frontalface_default.xml")
+        face_classifier = face_models.get_cascade()
 
         def face_cropped(img):
             gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
             faces = face_classifier.detectMultiScale(gray, 1.3, 5)
             if len(faces) > 0:
-                (x, y, w, h) = faces[0]
-                face_cropped = img[y:y + h, x:x + w]
-                return face_cropped
+                return normalize_face(gray, faces[0], equalize=False)
 
-        cam = cv2.VideoCapture(0)
+        cam = FrameGrabber().start()
         img_id = 0
 
-        path = os.path.abspath("FaceData")
-        self.assure_path_exists(path)
-
-        employee_name_clean = ''.join(e for e in employee_name if e.isalnum())
-        image_filename = f"{employee_name_clean}.{employee_id}"
+        face_data.discard_stage(employee_id)
+        stage_dir = face_data.stage_dir(employee_id)
+        self.assure_path_exists(stage_dir)
 
+        selector = EnrolmentSelector()
+        writer = AsyncImageWriter()
+        archived = []
+        frames = 0
+        camera_failed = False
         while True:
             ret, my_frame = cam.read()
-            cropped_face = face_cropped(my_frame)
-            if cropped_face is not None:
-                img_id += 1
-                face = cv2.resize(cropped_face, (450, 450))
-                face = cv2.cvtColor(face, cv2.COLOR_BGR2GRAY)
-                image_path = f"FaceData/{image_filename}.{img_id}.jpg"
-                cv2.imwrite(image_path, face)
-                cv2.putText(face, str(img_id), (50, 50),
+            if not ret:
+                camera_failed = True
+                break
+            frames += 1
+            face = face_cropped(my_frame)
+            if face is not None:
+                if selector.consider(face):
+                    img_id += 1
+                    if FACE_DATA_BACKEND == 'archive':
+                        archived.append(normalize_face(face))
+                    else:
+                        writer.write(os.path.join(stage_dir, f'{img_id}.jpg'), normalize_face(face))
+                preview = cv2.resize(face, (450, 450))
+                cv2.putText(preview, f'{img_id}/{selector.target}', (50, 50),
                             cv2.FONT_HERSHEY_COMPLEX, 2,
                             (0, 255, 0), 2)
 
-                cv2.imshow('Capturing Images', face)
+                cv2.imshow('Capturing Images', preview)
 
-            if cv2.waitKey(1) == 13 or int(img_id) == 200:
+            if cv2.waitKey(1) == 13 or selector.done() or frames >= ENROLMENT_MAX_FRAMES:
                 break
 
         cam.release()
         cv2.destroyAllWindows()
+        written, failed = writer.close()
+        staged = list(writer.saved)
+        if archived:
+            path = os.path.join(stage_dir, FACE_ARCHIVE_NAME)
+            try:
+                staged.append((path, *write_face_archive(path, archived)))
+                written += len(archived)
+            except OSError as e:
+                print(f'Cannot write face archive: {e}')
+                failed += len(archived)
+        if camera_failed and not frames:
+            face_data.discard_stage(employee_id)
+            messagebox.showerror('Camera Error',
+                                 'Cannot read from the camera. Please check that it is connected.',
+                                 parent=self.root)
+            return
+        if not staged:
+            face_data.discard_stage(employee_id)
+            messagebox.showerror('Result', 'No usable face images were captured. Please try again.',
+                                 parent=self.root)
+            return
+        # The previous capture is only removed now, so a failed retake keeps it; it is never
+        # trained together with the new one.
+        deleted = face_data.replace(employee_id, staged)
+        try:
+            feature_cache.discard(deleted)
+        except sqlite3.Error as e:
+            print("Error while discarding cached histograms:", e)
         self.enrolment_status_lb.config(text='Enrolment Status:\nImages Captured')
-        messagebox.showinfo('Result', 'Images Capture Successfully.')
+        if camera_failed:
+            messagebox.showwarning('Result', f'The camera stopped sending frames after {img_id} images.',
+                                   parent=self.root)
+        elif failed:
+            messagebox.showwarning('Result', f'{written} images saved, {failed} could not be written.')
+        else:
+            messagebox.showinfo('Result', 'Images Capture Successfully.')
 
     def train_images(self):
         employee_id = self.var_empID.get()
@@ -2851,39 +5062,54 @@ class EmployeeManagement(MainFrame):
         if not employee_id or not employee_name:
             messagebox.showerror('Error', 'Please select a valid employee!')
             return
+        if self.training_job is not None:
+            messagebox.showerror('Training In Progress',
+                                 'Please wait for the current training to finish.', parent=self.root)
+            return
 
-        self.assure_path_exists("FaceData/")
-        self.assure_path_exists("Classifier/")
+        self.assure_path_exists(CLASSIFIER_DIR)
 
-        employee_name_clean = ''.join(e for e in employee_name if e.isalnum())
-        image_filename = f"{employee_name_clean}.{employee_id}"
-        face_data_path = os.path.join("FaceData", f"{image_filename}.*.jpg")
-        if not glob.glob(face_data_path):
+        images, ids = face_data.images(employee_id)
+        if not images:
             messagebox.showerror('Error',
                                  'Face data for the selected employee '
                                  'is not available. Cannot proceed with training.')
             return
 
-        data_dir = "FaceData"
-        path = [os.path.join(data_dir, file) for file in os.listdir(data_dir)]
-        faces = []
-        ids = []
-
-        for image in path:
-            img = Image.open(image).convert('L')  # Gray Scale Image
-            imageNp = np.array(img, 'uint8')
-            id = int(os.path.split(image)[1].split('.')[1])
-            faces.append(imageNp)
-            ids.append(id)
-
-        ids = np.array(ids)
-        recognizer = cv2.face_LBPHFaceRecognizer.create()
-        recognizer.train(faces, ids)
-        recognizer.write("Classifier/Classifier.yml")
-        cv2.destroyAllWindows()
-        self.enrolment_status_lb.config(text='Enrolment Status:\nEnrolled')
-        self.update_face_id_in_database(employee_id, 'Enrolled')
-        messagebox.showinfo('Status', 'Successfully Enrolled.')
+        self.training_job = TrainingJob(employee_id, images, ids)
+        self.training_job.start()
+        self.enrolment_status_lb.config(text='Enrolment Status:\nTraining...')
+        self.cancel_training_btn.place(x=25, y=360, width=170, height=35)
+        self.root.after(TRAINING_POLL_INTERVAL, self.poll_training_job)
+
+    def poll_training_job(self):
+        job = self.training_job
+        if job is None:
+            return
+        visible = self.employee_mgmt_fm.winfo_exists()
+        for kind, text, done, total in job.poll():
+            if kind == 'progress' and visible and job.employee_id == self.var_empID.get():
+                self.enrolment_status_lb.config(text=f'Enrolment Status:\n{text} {done}/{total}')
+            elif kind == 'done':
+                self.update_face_id_in_database(job.employee_id, 'Enrolled')
+                messagebox.showinfo('Status', 'Successfully Enrolled.', parent=self.root)
+            elif kind == 'cancelled':
+                messagebox.showinfo('Status', 'Training cancelled.', parent=self.root)
+            elif kind == 'error':
+                messagebox.showerror('Error', f'Training failed due to: {text}', parent=self.root)
+
+        if not job.finished:
+            self.root.after(TRAINING_POLL_INTERVAL, self.poll_training_job)
+            return
+        self.training_job = None
+        if visible:
+            self.cancel_training_btn.place_forget()
+            self.update_enrolment_status()
+
+    def cancel_training(self):
+        if self.training_job is not None:
+            self.training_job.cancel()
+            self.enrolment_status_lb.config(text='Enrolment Status:\nCancelling...')
 
     def update_enrolment_status(self):
         try:
@@ -2905,6 +5131,7 @@ class EmployeeManagement(MainFrame):
                 cursor.execute('UPDATE employees SET face_id = ? WHERE employee_id = ?',
                                (status, employee_id))
                 conn.commit()
+                employee_directory.invalidate()
         except Exception as es:
             messagebox.showerror('Error', f'Due To: {str(es)}', parent=self.root)
 
@@ -3043,6 +5270,7 @@ class EmployeeManagement(MainFrame):
                                        self.var_sick_leave.get()
                                    ))
                     conn.commit()
+                    employee_directory.invalidate()
                     messagebox.showinfo('Success',
                                         'Employee has been registered!', parent=self.root)
                     self.fetch_data()
@@ -3050,16 +5278,12 @@ class EmployeeManagement(MainFrame):
             except Exception as es:
                 messagebox.showerror('Error', f'Due To: {str(es)}', parent=self.root)
 
-    def delete_face_data(self, employee_id, employee_name):
-        employee_name_clean = ''.join(e for e in employee_name if e.isalnum())
-        image_filename = f"{employee_name_clean}.{employee_id}"
-
-        directory_path = os.path.abspath("FaceData")
-        file_pattern = os.path.join(directory_path, f"{image_filename}.*.jpg")
-
-        for file_path in glob.glob(file_pattern):
-            os.remove(file_path)
-            print(f"Deleted: {file_path}")
+    def delete_face_data(self, employee_id):
+        deleted = face_data.remove(employee_id)
+        print(f"Deleted {len(deleted)} face images of employee {employee_id}")
+        # Tombstoning can trigger a full compaction of the model, so it runs off the Tk thread.
+        # Not a daemon: closing the app waits for the manifest to be published.
+        threading.Thread(target=remove_face_model, args=(employee_id, deleted)).start()
 
     def delete_data(self):
         if self.var_empID.get() == '':
@@ -3087,8 +5311,9 @@ class EmployeeManagement(MainFrame):
                             cursor.execute('DELETE FROM leave_balance WHERE employee_id = ?',
                                            (self.var_empID.get(),))
                             conn.commit()
+                            employee_directory.invalidate()
 
-                            self.delete_face_data(self.var_empID.get(), employee_name)
+                            self.delete_face_data(self.var_empID.get())
                             self.fetch_data()
                             messagebox.showinfo('Delete Success',
                                                 'Employee and corresponding face data have been deleted.')
@@ -3278,6 +5503,7 @@ class EmployeeManagement(MainFrame):
                                                                  self.var_is_admin.get(),
                                                                  self.var_empID.get()))
                         conn.commit()
+                        employee_directory.invalidate()
 
                 else:
                     if not update:
@@ -3424,9 +5650,65 @@ class ResetPassword(MainFrame):
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=WINDOW_TITLE)
+    parser.add_argument('--kiosk', metavar='LOCATION', choices=WORKING_LOCATIONS,
+                        help='run an unattended clock-in kiosk for this working location')
+    parser.add_argument('--ingest', metavar='PATH', nargs='+',
+                        help='record attendance from video files or folders of stills, then exit')
+    parser.add_argument('--location', choices=WORKING_LOCATIONS, help='working location for --ingest')
+    parser.add_argument('--migrate-face-data', action='store_true',
+                        help=f'move enrolment images into per-employee folders, resize them to '
+                             f'{FACE_SIZE}x{FACE_SIZE} and retrain, then exit')
+    parser.add_argument('--pack-face-data', action='store_true',
+                        help="replace each employee's enrolment JPEGs with one compressed archive, then exit")
+    parser.add_argument('--compact-model', action='store_true',
+                        help='merge all model segments and drop deleted employees, then exit')
+    parser.add_argument('--check-face-data', action='store_true',
+                        help='check every enrolment image and model segment against its checksum, then exit')
+    parser.add_argument('--workers', type=int, default=INGEST_WORKERS, help='processes for --ingest')
+    parser.add_argument('--attendance-type', choices=ATTENDANCE_TYPES,
+                        help='record only this type (kiosk) or the type to ingest (default Clock in)')
+    parser.add_argument('--source', default=CAMERA_SOURCE,
+                        help="camera index, video file, directory of images or 'synthetic'")
+    parser.add_argument('--fps', type=float, help='limit how fast frames are read from the source')
+    parser.add_argument('--cooldown', type=float, default=KIOSK_COOLDOWN,
+                        help='seconds before the same employee is recorded again')
+    parser.add_argument('--min-shift', type=float, default=KIOSK_MIN_SHIFT,
+                        help='seconds after a clock-in before the kiosk records a clock-out')
+    parser.add_argument('--max-shift', type=float, default=KIOSK_MAX_SHIFT,
+                        help='seconds after a clock-in after which the next scan is a new clock-in')
+    parser.add_argument('--headless', action='store_true', help='do not open a preview window')
+    parser.add_argument('--recognizers', type=int, default=0,
+                        help='run capture and recognition in separate processes sharing frames through '
+                             'shared memory, with this many recognizer processes (no preview window)')
+    args = parser.parse_args()
+
     db_file = "employees.db"
     initiate_db = InitiateDatabase(db_file)
     initiate_db.create_tables()
-    root = Tk()
-    app = LoginApp(root)
-    root.mainloop()
+    # Deletion and training only see images listed in face_images, so an older flat FaceData
+    # folder is moved into place right away; --migrate-face-data also resizes and retrains.
+    if not args.migrate_face_data:
+        moved = face_data.migrate_flat_layout()
+        if moved:
+            print(f'FaceData: {moved} images moved into per-employee folders')
+    if args.migrate_face_data:
+        migrate_face_data()
+    elif args.pack_face_data:
+        pack_face_data()
+    elif args.compact_model:
+        compact_model()
+    elif args.check_face_data:
+        check_face_data()
+    elif args.ingest:
+        if not args.location:
+            parser.error('--ingest needs a --location')
+        ingest_recordings(args.ingest, args.location, args.attendance_type or 'Clock in', args.workers)
+    elif args.kiosk:
+        AttendanceKiosk(args.kiosk, args.source, args.attendance_type, args.cooldown,
+                        show=not args.headless, fps=args.fps, recognizers=args.recognizers,
+                        min_shift=args.min_shift, max_shift=args.max_shift).run()
+    else:
+        root = Tk()
+        app = LoginApp(root)
+        root.mainloop()